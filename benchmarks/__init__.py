@@ -0,0 +1 @@
+"""Reproducible benchmarks for order_sync with synthetic data and in-process fake backends."""
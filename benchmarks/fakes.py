@@ -0,0 +1,464 @@
+"""In-process stand-ins for the Mongo collections and the Drive v3 files() API.
+
+They implement only what order_sync uses (find/sort/limit, find_one, the aggregation stages of
+mongo_fetch, and files().list/get/get_media/create/update), with enough fidelity to run the real
+sync code paths end to end without network access."""
+import hashlib
+import itertools
+import re
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httplib2
+
+
+def _get_path(doc: Any, path: str) -> Any:
+	cur = doc
+	for part in path.split("."):
+		if not isinstance(cur, dict):
+			return None
+		cur = cur.get(part)
+	return cur
+
+
+def _bson_value(val: Any) -> Any:
+	"""BSON dates are UTC instants: compare aware and naive (UTC) datetimes alike."""
+	if isinstance(val, datetime) and val.tzinfo is not None:
+		return val.astimezone(timezone.utc).replace(tzinfo=None)
+	return val
+
+
+def _matches_value(val: Any, cond: Any) -> bool:
+	val = _bson_value(val)
+	if not isinstance(cond, dict):
+		cond = _bson_value(cond)
+	if isinstance(cond, re.Pattern):
+		return isinstance(val, str) and cond.search(val) is not None
+	if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+		for op, arg in cond.items():
+			arg = _bson_value(arg)
+			if op == "$in":
+				if not any(_matches_value(val, a) for a in arg):
+					return False
+			elif op == "$nin":
+				if any(_matches_value(val, a) for a in arg):
+					return False
+			elif op == "$gt":
+				if val is None or not val > arg:
+					return False
+			elif op == "$gte":
+				if val is None or not val >= arg:
+					return False
+			elif op == "$lt":
+				if val is None or not val < arg:
+					return False
+			elif op == "$lte":
+				if val is None or not val <= arg:
+					return False
+			elif op == "$ne":
+				if val == arg:
+					return False
+			elif op == "$regex":
+				if not isinstance(val, str) or re.search(arg, val) is None:
+					return False
+			elif op == "$options":
+				continue
+			else:
+				raise NotImplementedError(f"query operator {op}")
+		return True
+	return val == cond
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+	for key, cond in query.items():
+		if key == "$and":
+			if not all(matches(doc, q) for q in cond):
+				return False
+		elif key == "$or":
+			if not any(matches(doc, q) for q in cond):
+				return False
+		elif not _matches_value(_get_path(doc, key), cond):
+			return False
+	return True
+
+
+def project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+	if not projection:
+		return dict(doc)
+	out: Dict[str, Any] = {}
+	if projection.get("_id", 1) and "_id" in doc:
+		out["_id"] = doc["_id"]
+	for key, flag in projection.items():
+		if key == "_id" or not flag:
+			continue
+		if "." in key:
+			head, rest = key.split(".", 1)
+			sub = doc.get(head)
+			if isinstance(sub, dict):
+				out.setdefault(head, {}).update(project(sub, {rest: 1, "_id": 0}))
+		elif key in doc:
+			out[key] = doc[key]
+	return out
+
+
+def _sort_docs(docs: List[Dict[str, Any]], keys: List[tuple]) -> None:
+	for key, direction in reversed(keys):
+		docs.sort(key=lambda d: (_get_path(d, key) is not None, _bson_value(_get_path(d, key))), reverse=direction < 0)
+
+
+class FakeCursor:
+	def __init__(self, docs: List[Dict[str, Any]]) -> None:
+		self._docs = docs
+		self._limit = 0
+
+	def sort(self, key: Any, direction: int = 1) -> "FakeCursor":
+		keys = key if isinstance(key, list) else [(key, direction)]
+		_sort_docs(self._docs, keys)
+		return self
+
+	def limit(self, n: int) -> "FakeCursor":
+		self._limit = int(n)
+		return self
+
+	def skip(self, n: int) -> "FakeCursor":
+		self._docs = self._docs[int(n):]
+		return self
+
+	def batch_size(self, n: int) -> "FakeCursor":
+		return self
+
+	def hint(self, index: Any) -> "FakeCursor":
+		return self
+
+	def __iter__(self) -> Iterator[Dict[str, Any]]:
+		docs = self._docs[:self._limit] if self._limit else self._docs
+		return iter(docs)
+
+	def close(self) -> None:
+		pass
+
+
+def _eval(doc: Dict[str, Any], expr: Any, variables: Optional[Dict[str, Any]] = None) -> Any:
+	"""Aggregation expression: field paths, $$variables, $slice/$ifNull/$map and object literals."""
+	if isinstance(expr, str) and expr.startswith("$$"):
+		name, _, rest = expr[2:].partition(".")
+		val = (variables or {}).get(name)
+		return _get_path(val, rest) if rest else val
+	if isinstance(expr, str) and expr.startswith("$"):
+		return _get_path(doc, expr[1:])
+	if isinstance(expr, dict):
+		if len(expr) == 1 and next(iter(expr)).startswith("$"):
+			(op, arg), = expr.items()
+			if op == "$slice":
+				seq = _eval(doc, arg[0], variables) or []
+				n = _eval(doc, arg[1], variables)
+				return seq[:n] if n >= 0 else seq[n:]
+			if op == "$ifNull":
+				val = _eval(doc, arg[0], variables)
+				return val if val is not None else _eval(doc, arg[1], variables)
+			if op == "$map":
+				items = _eval(doc, arg["input"], variables) or []
+				return [_eval(doc, arg["in"], {**(variables or {}), arg.get("as", "this"): item}) for item in items]
+			raise NotImplementedError(f"expression {op}")
+		out = {}
+		for key, sub in expr.items():
+			val = _eval(doc, sub, variables)
+			if val is not None:
+				out[key] = val
+		return out
+	return expr
+
+
+class FakeCollection:
+	"""Minimal pymongo Collection. `database` maps sibling collection names for $lookup."""
+
+	def __init__(self, docs: Optional[List[Dict[str, Any]]] = None, database: Optional[Dict[str, "FakeCollection"]] = None) -> None:
+		self.docs: List[Dict[str, Any]] = list(docs or [])
+		self.database = database if database is not None else {}
+		self.calls = 0
+
+	def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs: Any) -> FakeCursor:
+		self.calls += 1
+		q = query or {}
+		return FakeCursor([project(d, projection) for d in self.docs if matches(d, q)])
+
+	def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+		for doc in self.find(query, projection):
+			return doc
+		return None
+
+	def count_documents(self, query: Dict[str, Any], skip: int = 0, limit: int = 0, **kwargs: Any) -> int:
+		self.calls += 1
+		n = max(0, sum(1 for d in self.docs if matches(d, query)) - skip)
+		return min(n, limit) if limit else n
+
+	def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> FakeCursor:
+		self.calls += 1
+		return FakeCursor(self._run(list(self.docs), pipeline))
+
+	def _run(self, docs: List[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+		for stage in pipeline:
+			(op, arg), = stage.items()
+			handler: Callable[[List[Dict[str, Any]], Any], List[Dict[str, Any]]] = getattr(self, "_stage_" + op[1:])
+			docs = handler(docs, arg)
+		return docs
+
+	def _stage_match(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		return [d for d in docs if matches(d, arg)]
+
+	def _stage_project(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		plain = {k: v for k, v in arg.items() if not isinstance(v, (dict, str))}
+		computed = {k: v for k, v in arg.items() if isinstance(v, (dict, str))}
+		out = []
+		for d in docs:
+			doc = project(d, plain)
+			for key, expr in computed.items():
+				doc[key] = _eval(d, expr)
+			out.append(doc)
+		return out
+
+	def _stage_sort(self, docs: List[Dict[str, Any]], arg: Dict[str, int]) -> List[Dict[str, Any]]:
+		_sort_docs(docs, list(arg.items()))
+		return docs
+
+	def _stage_limit(self, docs: List[Dict[str, Any]], arg: int) -> List[Dict[str, Any]]:
+		return docs[:arg]
+
+	def _stage_unwind(self, docs: List[Dict[str, Any]], arg: Any) -> List[Dict[str, Any]]:
+		field = (arg if isinstance(arg, str) else arg["path"])[1:]
+		return [{**d, field: item} for d in docs for item in (d.get(field) or [])]
+
+	def _stage_replaceRoot(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		return [_eval(d, arg["newRoot"]) for d in docs]
+
+	def _stage_bucketAuto(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		# even split of the sorted values; equal values stay in one bucket (no granularity support)
+		values = sorted((_eval(d, arg["groupBy"]) for d in docs), key=lambda v: (v is not None, _bson_value(v)))
+		if not values:
+			return []
+		size = -(-len(values) // int(arg["buckets"]))
+		buckets: List[List[Any]] = []
+		for val in values:
+			if buckets and (len(buckets[-1]) < size or _bson_value(buckets[-1][-1]) == _bson_value(val)):
+				buckets[-1].append(val)
+			else:
+				buckets.append([val])
+		out = []
+		for i, bucket in enumerate(buckets):
+			high = buckets[i + 1][0] if i + 1 < len(buckets) else bucket[-1]
+			out.append({"_id": {"min": bucket[0], "max": high}, "count": len(bucket)})
+		return out
+
+	def _stage_group(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		groups: Dict[Any, Dict[str, Any]] = {}
+		for d in docs:
+			key = _eval(d, arg["_id"])
+			group = groups.setdefault(key, {"_id": key})
+			for field, acc in arg.items():
+				if field == "_id":
+					continue
+				(acc_op, expr), = acc.items()
+				if acc_op == "$topN":
+					group.setdefault(field, []).append((d, _eval(d, expr["output"])))
+					continue
+				val = _eval(d, expr)
+				if acc_op == "$push":
+					group.setdefault(field, []).append(val)
+				elif acc_op == "$first":
+					group.setdefault(field, val)
+				elif acc_op == "$last":
+					group[field] = val
+				elif acc_op == "$sum":
+					group[field] = group.get(field, 0) + val
+				elif acc_op == "$max":
+					if field not in group or val > group[field]:
+						group[field] = val
+				elif acc_op == "$min":
+					if field not in group or val < group[field]:
+						group[field] = val
+				else:
+					raise NotImplementedError(f"accumulator {acc_op}")
+		for field, acc in arg.items():
+			if field != "_id" and "$topN" in acc:
+				spec = acc["$topN"]
+				for group in groups.values():
+					pairs = [(doc, out) for doc, out in group.get(field, [])]
+					docs_sorted = [doc for doc, _ in pairs]
+					_sort_docs(docs_sorted, list(spec["sortBy"].items()))
+					by_id = {id(doc): out for doc, out in pairs}
+					group[field] = [by_id[id(doc)] for doc in docs_sorted[:spec["n"]]]
+		return list(groups.values())
+
+	def _stage_lookup(self, docs: List[Dict[str, Any]], arg: Dict[str, Any]) -> List[Dict[str, Any]]:
+		other = self.database[arg["from"]]
+		index: Dict[Any, List[Dict[str, Any]]] = {}
+		for o in other.docs:
+			index.setdefault(_get_path(o, arg["foreignField"]), []).append(o)
+		out = []
+		for d in docs:
+			found = list(index.get(_get_path(d, arg["localField"]), []))
+			if arg.get("pipeline"):
+				found = other._run(found, arg["pipeline"])
+			out.append({**d, arg["as"]: found})
+		return out
+
+
+class FakeMongoSession:
+	"""Duck-typed order_sync.mongo_fetch.MongoSession backed by FakeCollections."""
+
+	def __init__(self, orders: List[Dict[str, Any]], order_logs: List[Dict[str, Any]], accounts: List[Dict[str, Any]]) -> None:
+		orders_db: Dict[str, FakeCollection] = {}
+		self.orders = FakeCollection(orders, orders_db)
+		self.order_logs = FakeCollection(order_logs, orders_db)
+		orders_db.update({"Order": self.orders, "OrderLog": self.order_logs})
+		self.accounts = FakeCollection(accounts)
+
+	def close(self) -> None:
+		pass
+
+	def __enter__(self) -> "FakeMongoSession":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self.close()
+
+
+class _Executable:
+	def __init__(self, fn: Callable[[], Any]) -> None:
+		self._fn = fn
+
+	def execute(self, num_retries: int = 0) -> Any:
+		return self._fn()
+
+
+class _UploadRequest:
+	"""Request returned by create/update: supports execute() and resumable next_chunk()."""
+
+	def __init__(self, media: Any, finish: Callable[[bytes], Dict[str, Any]]) -> None:
+		self._media = media
+		self._finish = finish
+		self._buf = bytearray()
+
+	def execute(self, num_retries: int = 0) -> Dict[str, Any]:
+		return self._finish(self._media.getbytes(0, self._media.size()))
+
+	def next_chunk(self, http: Any = None, num_retries: int = 0) -> Any:
+		size = self._media.size()
+		chunk = self._media.chunksize() if self._media.resumable() else size
+		self._buf += self._media.getbytes(len(self._buf), chunk)
+		if len(self._buf) >= size:
+			return None, self._finish(bytes(self._buf))
+		return _Progress(len(self._buf), size), None
+
+
+class _Progress:
+	def __init__(self, done: int, total: int) -> None:
+		self.resumable_progress = done
+		self.total_size = total
+
+	def progress(self) -> float:
+		return self.resumable_progress / self.total_size if self.total_size else 1.0
+
+
+class _MediaHttp:
+	def __init__(self, data: bytes) -> None:
+		self._data = data
+
+	def request(self, uri: str, method: str = "GET", headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> Any:
+		total = len(self._data)
+		rng = (headers or {}).get("range")
+		start, end = 0, total - 1
+		if rng:
+			a, b = rng.split("=", 1)[1].split("-")
+			start, end = int(a), min(int(b), total - 1)
+		body = self._data[start:end + 1]
+		resp = httplib2.Response({"status": 206, "content-range": f"bytes {start}-{end}/{total}"})
+		return resp, body
+
+
+class _MediaRequest:
+	def __init__(self, data: bytes) -> None:
+		self.uri = "fake://media"
+		self.headers: Dict[str, str] = {}
+		self.http = _MediaHttp(data)
+
+
+class FakeDriveFiles:
+	_NAME_RE = re.compile(r"name = '((?:[^'\\]|\\.)*)'")
+	_PARENT_RE = re.compile(r"'([^']+)' in parents")
+
+	def __init__(self, drive: "FakeDrive") -> None:
+		self._drive = drive
+
+	def list(self, q: str = "", fields: str = "", pageSize: int = 100, pageToken: Optional[str] = None, **kwargs: Any) -> _Executable:
+		self._drive.calls["list"] += 1
+
+		def run() -> Dict[str, Any]:
+			name_m = self._NAME_RE.search(q)
+			parent_m = self._PARENT_RE.search(q)
+			files = [
+				self._drive.metadata(fid) for fid, f in sorted(self._drive.stored.items())
+				if (not name_m or f["name"] == name_m.group(1).replace("\\'", "'"))
+				and (not parent_m or parent_m.group(1) in f["parents"])
+			]
+			start = int(pageToken or 0)
+			page = files[start:start + pageSize]
+			out: Dict[str, Any] = {"files": page}
+			if start + pageSize < len(files):
+				out["nextPageToken"] = str(start + pageSize)
+			return out
+		return _Executable(run)
+
+	def get(self, fileId: str, fields: str = "", **kwargs: Any) -> _Executable:
+		self._drive.calls["get"] += 1
+		return _Executable(lambda: self._drive.metadata(fileId))
+
+	def get_media(self, fileId: str, **kwargs: Any) -> _MediaRequest:
+		self._drive.calls["get_media"] += 1
+		return _MediaRequest(self._drive.stored[fileId]["data"])
+
+	def create(self, body: Dict[str, Any], media_body: Any = None, fields: str = "", **kwargs: Any) -> _UploadRequest:
+		self._drive.calls["create"] += 1
+
+		def finish(data: bytes) -> Dict[str, Any]:
+			fid = f"file{next(self._drive._ids)}"
+			self._drive.stored[fid] = {"name": body["name"], "parents": list(body.get("parents", [])), "data": b"", "rev": 0}
+			self._drive.store(fid, data)
+			return self._drive.metadata(fid)
+		return _UploadRequest(media_body, finish)
+
+	def update(self, fileId: str, media_body: Any = None, fields: str = "", **kwargs: Any) -> _UploadRequest:
+		self._drive.calls["update"] += 1
+
+		def finish(data: bytes) -> Dict[str, Any]:
+			self._drive.store(fileId, data)
+			return self._drive.metadata(fileId)
+		return _UploadRequest(media_body, finish)
+
+
+class FakeDrive:
+	"""Drive v3 client stand-in keeping file bytes in memory. `calls` counts API requests."""
+
+	def __init__(self) -> None:
+		self.stored: Dict[str, Dict[str, Any]] = {}
+		self.calls: Dict[str, int] = {"list": 0, "get": 0, "get_media": 0, "create": 0, "update": 0}
+		self._ids = itertools.count(1)
+
+	def files(self) -> FakeDriveFiles:
+		return FakeDriveFiles(self)
+
+	def store(self, file_id: str, data: bytes) -> None:
+		f = self.stored[file_id]
+		f["data"] = data
+		f["rev"] += 1
+
+	def metadata(self, file_id: str) -> Dict[str, Any]:
+		f = self.stored[file_id]
+		return {
+			"id": file_id,
+			"name": f["name"],
+			"md5Checksum": hashlib.md5(f["data"]).hexdigest(),
+			"headRevisionId": f"{file_id}-r{f['rev']}",
+			"modifiedTime": None,
+			"size": str(len(f["data"])),
+		}
@@ -0,0 +1,202 @@
+"""Benchmark driver: python -m benchmarks.run [--sizes 1000,10000] [--ratios 0.001,0.01,0.1] [--output results.json]
+
+Runs the real order_sync code paths against the in-process fakes and writes one JSON document
+with a record per (benchmark, size, ratio): wall seconds, rows, bytes and peak memory."""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+	import order_sync  # noqa: F401
+except ImportError:
+	sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from order_sync import cli
+from order_sync.config import Config
+from order_sync.drive import DriveFolderIndex
+from order_sync.excel_sync import read_report_rows, write_report_streaming
+from order_sync.metrics import peak_rss_bytes
+from order_sync.mongo_mapping import REPORT_COLUMNS, iter_report_row_tuples
+from order_sync.state_store import STATE_DB_FILE, StateStore
+
+from .fakes import FakeDrive, FakeMongoSession
+from .synthetic import BENCH_ACCOUNT_ID, EPOCH, make_account, make_changes, make_orders
+
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+DEFAULT_RATIOS = [0.001, 0.01, 0.1]
+BENCH_FOLDER_ID = "bench-folder"
+
+
+def _peak_rss_kb() -> Optional[int]:
+	peak = peak_rss_bytes()
+	return peak // 1024 if peak is not None else None
+
+
+def _git_commit() -> Optional[str]:
+	try:
+		out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent)
+		return out.stdout.strip() or None
+	except OSError:
+		return None
+
+
+class Recorder:
+	def __init__(self, trace_memory: bool = False, quiet: bool = False) -> None:
+		self.results: List[Dict[str, Any]] = []
+		self.trace_memory = trace_memory
+		self.quiet = quiet
+
+	def measure(self, name: str, fn: Callable[[], Dict[str, Any]], **labels: Any) -> Dict[str, Any]:
+		if self.trace_memory:
+			tracemalloc.start()
+		started = time.perf_counter()
+		# the sync code prints progress lines; keep the benchmark output readable
+		with contextlib.redirect_stdout(io.StringIO()):
+			extra = fn() or {}
+		seconds = time.perf_counter() - started
+		record: Dict[str, Any] = {"name": name, **labels, "seconds": round(seconds, 4), **extra, "peak_rss_kb": _peak_rss_kb()}
+		if self.trace_memory:
+			record["traced_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+			tracemalloc.stop()
+		if not self.quiet:
+			shown = ", ".join(f"{k}={v}" for k, v in record.items() if k != "name")
+			print(f"{name:<18} {shown}", file=sys.stderr)
+		self.results.append(record)
+		return record
+
+
+def _bench_config(output_dir: Path, workbook_memory_limit: int) -> Config:
+	return Config(
+		mongo_uri="mongodb://bench",
+		output_dir=str(output_dir),
+		timezone=None,
+		drive_client_email=None,
+		drive_private_key=None,
+		drive_folder_id=BENCH_FOLDER_ID,
+		account_ids=[str(BENCH_ACCOUNT_ID)],
+		ref_prefixes=[],
+		account_ids_no_prefix=[],
+		workbook_memory_limit=workbook_memory_limit,
+	)
+
+
+def bench_xlsx(rec: Recorder, size: int, seed: int, workdir: Path) -> None:
+	"""Write the report with the streaming writer, then read it back with the fast reader."""
+	orders = make_orders(size, BENCH_ACCOUNT_ID, seed=seed)
+	rows = list(iter_report_row_tuples(orders))
+	del orders
+	out_dir = workdir / "xlsx"
+	written: Dict[str, Path] = {}
+
+	def write() -> Dict[str, Any]:
+		path, count = write_report_streaming("bench", rows, REPORT_COLUMNS, out_dir, EPOCH)
+		written["path"] = path
+		return {"rows": count, "bytes": path.stat().st_size}
+
+	def read() -> Dict[str, Any]:
+		return {"rows": len(read_report_rows(written["path"], REPORT_COLUMNS))}
+
+	rec.measure("xlsx_write", write, size=size)
+	rec.measure("xlsx_read", read, size=size)
+
+
+def bench_sync(rec: Recorder, size: int, ratios: List[float], seed: int, workdir: Path, workbook_memory_limit: int) -> None:
+	"""Full rebuild into an empty Drive folder, then one incremental run per change ratio.
+	Ratios are applied cumulatively to the same account, as successive cron runs would be.
+	workbook_memory_limit is WORKBOOK_MEMORY_LIMIT (0: workbooks go through temp files)."""
+	orders = make_orders(size, BENCH_ACCOUNT_ID, seed=seed)
+	session = FakeMongoSession(orders, [], [make_account()])
+	drive = FakeDrive()
+	output_dir = workdir / "sync"
+	cfg = _bench_config(output_dir, workbook_memory_limit)
+	acc_id = str(BENCH_ACCOUNT_ID)
+	now = datetime.now(timezone.utc).replace(microsecond=0)
+
+	store = StateStore(output_dir / STATE_DB_FILE)
+
+	def run_at(when: datetime) -> cli.RunContext:
+		return cli.RunContext(cfg, session, store, output_dir, when, index=DriveFolderIndex.load(drive, BENCH_FOLDER_ID))
+
+	def full() -> Dict[str, Any]:
+		cli._sync_account(run_at(now), drive, acc_id)
+		return {"rows": size, "drive_calls": dict(drive.calls)}
+
+	rec.measure("full_rebuild", full, size=size)
+	for step, ratio in enumerate(ratios, start=1):
+		changed_at = now + timedelta(hours=2 * step - 1)
+		synced_at = now + timedelta(hours=2 * step)
+		changes = make_changes(orders, ratio, changed_at, seed=seed + step)
+		orders.extend(changes["orders"])
+		session.orders.docs.extend(changes["orders"])
+		session.order_logs.docs.extend(changes["logs"])
+		before = dict(drive.calls)
+
+		def incremental() -> Dict[str, Any]:
+			cli._sync_account(run_at(synced_at), drive, acc_id)
+			calls = {k: v - before.get(k, 0) for k, v in drive.calls.items()}
+			return {"rows": len(orders), "changed_orders": len({log["orderId"] for log in changes["logs"]}), "drive_calls": calls}
+
+		rec.measure("incremental", incremental, size=size, ratio=ratio)
+	store.close()
+
+
+def _parse_list(value: str, cast: Callable[[str], Any]) -> List[Any]:
+	return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="order_sync benchmarks against in-process fakes")
+	parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma-separated order counts")
+	parser.add_argument("--ratios", default=",".join(str(r) for r in DEFAULT_RATIOS), help="Comma-separated change ratios for incremental runs")
+	parser.add_argument("--only", choices=["xlsx", "sync"], default=None, help="Run only one benchmark group")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--workbook-memory-limit", type=int, default=Config.workbook_memory_limit, help="Bytes a workbook is kept in memory before spilling to a temp file (0: always temp files)")
+	parser.add_argument("--trace-memory", action="store_true", help="Also record tracemalloc peaks (slower)")
+	parser.add_argument("--output", default=None, help="Write JSON results to this file (default: stdout)")
+	args = parser.parse_args(argv)
+
+	sizes = _parse_list(args.sizes, int)
+	ratios = _parse_list(args.ratios, float)
+	rec = Recorder(trace_memory=args.trace_memory)
+	for size in sizes:
+		with tempfile.TemporaryDirectory(prefix="order_sync_bench_") as tmp:
+			workdir = Path(tmp)
+			if args.only in (None, "xlsx"):
+				bench_xlsx(rec, size, args.seed, workdir)
+			if args.only in (None, "sync"):
+				bench_sync(rec, size, ratios, args.seed, workdir, args.workbook_memory_limit)
+
+	doc = {
+		"meta": {
+			"started_at": datetime.now(timezone.utc).isoformat(),
+			"commit": _git_commit(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"seed": args.seed,
+			"sizes": sizes,
+			"ratios": ratios,
+			"workbook_memory_limit": args.workbook_memory_limit,
+		},
+		"results": rec.results,
+	}
+	text = json.dumps(doc, indent=2)
+	if args.output:
+		Path(args.output).write_text(text + "\n", encoding="utf-8")
+	else:
+		print(text)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,103 @@
+"""Seeded generator of Order / OrderLog documents shaped like the MGP-ORDER collections.
+
+Orders carry every field in mongo_fetch.ORDER_PROJECTION plus accountId; the same seed always
+yields the same documents, so timings are comparable across commits."""
+import random
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence
+
+from bson import ObjectId
+
+
+PORTS = ["Buenos Aires", "Shanghai", "Rotterdam", "Santos", "Miami", "Valencia", "Singapore", "Houston", "Callao", "Hamburg"]
+REF_PREFIXES = ["VARE", "VARI", "OTHR"]
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+BENCH_ACCOUNT_ID = ObjectId("64b0c0ffee00000000000001")
+
+
+def object_id_at(when: datetime, rng: random.Random) -> ObjectId:
+	"""ObjectId whose embedded timestamp is `when` (4-byte seconds + 8 random bytes)."""
+	ts = int(when.timestamp())
+	return ObjectId(struct.pack(">I", ts) + bytes(rng.getrandbits(8) for _ in range(8)))
+
+
+def make_order(rng: random.Random, account_id: ObjectId, seq: int, created_at: datetime) -> Dict[str, Any]:
+	etd = created_at + timedelta(days=rng.randint(3, 40))
+	stopovers = [{"stopoverName": rng.choice(PORTS)} for _ in range(rng.randint(0, 2))]
+	return {
+		"_id": object_id_at(created_at, rng),
+		"accountId": account_id,
+		"number": f"{rng.choice(REF_PREFIXES)}{seq:07d}",
+		"bookingNumber": f"BK{rng.randint(10**7, 10**8 - 1)}",
+		"dateETD": etd,
+		"isMANE": rng.random() < 0.6,
+		"dateETA": etd + timedelta(days=rng.randint(10, 45)),
+		"isMANI": rng.random() < 0.4,
+		"origin": rng.choice(PORTS),
+		"stopovers": stopovers,
+		"destination": rng.choice(PORTS),
+		"internalClientNumber": f"C-{rng.randint(1, 9999):04d}",
+		"isISF": rng.random() < 0.3,
+		"dateISF": etd - timedelta(days=2) if rng.random() < 0.3 else None,
+		"createdAt": created_at,
+		"dateLastUpdate": created_at,
+	}
+
+
+def make_orders(n: int, account_id: ObjectId, seed: int = 0, start: datetime = EPOCH) -> List[Dict[str, Any]]:
+	"""n orders for one account, createdAt spaced one minute apart from `start`."""
+	rng = random.Random(seed)
+	return [make_order(rng, account_id, i, start + timedelta(minutes=i)) for i in range(n)]
+
+
+def make_changes(
+	orders: Sequence[Dict[str, Any]],
+	ratio: float,
+	at: datetime,
+	seed: int = 1,
+	new_ratio: float = 0.1,
+	logs_per_order: int = 2,
+) -> Dict[str, List[Dict[str, Any]]]:
+	"""Mutate a `ratio` share of `orders` (plus `new_ratio` of that count as brand-new orders) and
+	return {"orders": new orders, "logs": OrderLog entries timestamped at `at`}. Existing orders
+	are updated in place, as the Order collection would be."""
+	rng = random.Random(seed)
+	if not orders:
+		return {"orders": [], "logs": []}
+	account_id = orders[0]["accountId"]
+	n_changed = max(1, int(len(orders) * ratio))
+	changed = rng.sample(list(orders), min(n_changed, len(orders)))
+	new_orders = [
+		make_order(rng, account_id, len(orders) + i, at)
+		for i in range(int(n_changed * new_ratio))
+	]
+	logs: List[Dict[str, Any]] = []
+	for order in changed:
+		old_etd = order["dateETD"]
+		order["dateETD"] = old_etd + timedelta(days=rng.randint(1, 5))
+		order["isMANE"] = not order["isMANE"]
+		order["dateLastUpdate"] = at
+		for _ in range(logs_per_order):
+			logs.append(_log(rng, account_id, order["_id"], at, "update", [
+				{"fieldName": "dateETD", "oldValue": old_etd, "newValue": order["dateETD"]},
+				{"fieldName": "isMANE", "oldValue": not order["isMANE"], "newValue": order["isMANE"]},
+			]))
+	for order in new_orders:
+		logs.append(_log(rng, account_id, order["_id"], at, "create", []))
+	return {"orders": new_orders, "logs": logs}
+
+
+def _log(rng: random.Random, account_id: ObjectId, order_id: ObjectId, at: datetime, action: str, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+	return {
+		"_id": object_id_at(at, rng),
+		"accountId": account_id,
+		"orderId": order_id,
+		"action": action,
+		"date": at,
+		"fieldChanges": changes,
+	}
+
+
+def make_account(account_id: ObjectId = BENCH_ACCOUNT_ID, name: str = "Bench Account") -> Dict[str, Any]:
+	return {"_id": account_id, "accountName": name}
@@ -0,0 +1,94 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .mongo_fetch import MongoSession, fetch_account_names
+from .utils import atomic_write
+
+
+ACCOUNT_NAMES_FILE = "account_names.json"
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+class AccountNameError(LookupError):
+	"""The account's name (hence its Drive file name) could not be resolved."""
+
+
+class AccountNames:
+	"""Account names resolved for a run (account id -> accountName), plus the accounts whose lookup
+	failed with nothing cached."""
+
+	def __init__(self, names: Dict[str, Optional[str]], errors: Optional[Dict[str, str]] = None) -> None:
+		self.names = names
+		self.errors = errors or {}
+
+	def filename_id(self, account_id: str) -> str:
+		"""accountName, or the account id for accounts without one. Raises AccountNameError when the
+		lookup failed and nothing was cached, rather than renaming the account's file to its id."""
+		if account_id in self.errors:
+			raise AccountNameError(f"account name lookup failed for {account_id}: {self.errors[account_id]}")
+		return self.names.get(account_id) or account_id
+
+
+class AccountNameCache:
+	"""Account names cached as JSON; only missing or expired entries are looked up, in one query.
+	If that query fails, stale entries are still used."""
+
+	_lock = threading.Lock()
+
+	def __init__(self, path: Path, ttl_seconds: float = DEFAULT_TTL_SECONDS, clock: Callable[[], float] = time.time) -> None:
+		self.path = path
+		self.ttl_seconds = ttl_seconds
+		self.clock = clock
+
+	def _load(self) -> Dict[str, Dict[str, Any]]:
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				raw = json.load(f)
+		except (OSError, ValueError):
+			return {}
+		accounts = raw.get("accounts") if isinstance(raw, dict) else None
+		return accounts if isinstance(accounts, dict) else {}
+
+	def _save(self, entries: Dict[str, Dict[str, Any]]) -> None:
+		with atomic_write(self.path) as f:
+			json.dump({"accounts": entries}, f, indent=2)
+
+	def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+		fetched_at = entry.get("fetched_at")
+		return isinstance(fetched_at, (int, float)) and self.clock() - fetched_at < self.ttl_seconds
+
+	def resolve(self, session: MongoSession, account_ids: List[str], refresh: bool = False) -> AccountNames:
+		"""Names for account_ids: cached while fresh (unless refresh), the rest in one $in query."""
+		with self._lock:
+			entries = self._load()
+			stale = [a for a in dict.fromkeys(account_ids) if refresh or a not in entries or not self._is_fresh(entries[a])]
+			errors: Dict[str, str] = {}
+			if stale:
+				try:
+					found = fetch_account_names(session, stale)
+				except Exception as e:
+					found = None
+					error = f"{type(e).__name__}: {e}"
+					for acc_id in stale:
+						if acc_id in entries:
+							print(f"WARN: account name lookup failed, using cached name for {acc_id}: {error}", file=sys.stderr)
+						else:
+							errors[acc_id] = error
+				if found is not None:
+					now = self.clock()
+					for acc_id in stale:
+						if acc_id in found:
+							entries[acc_id] = {"name": found[acc_id], "fetched_at": now}
+						elif acc_id in entries:
+							# keep the file name the account has been using
+							print(f"WARN: account {acc_id} not found, keeping its cached name", file=sys.stderr)
+					try:
+						self._save(entries)
+					except OSError as e:
+						print(f"WARN: Could not write account name cache: {e}", file=sys.stderr)
+			names = {a: entries[a].get("name") for a in account_ids if a in entries}
+		return AccountNames(names, errors)
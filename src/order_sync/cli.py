@@ -1,41 +1,338 @@
 import argparse
+import signal
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timezone
 import tempfile
 
-from openpyxl import load_workbook
-
-from .excel_sync import write_report_for_user, read_last_sync, write_last_sync, upsert_report_for_user_with_stats
-from .config import load_env_file, get_config
-from .drive import build_drive_client, upload_or_update_file, find_file_id_by_name, download_file
+from .account_names import ACCOUNT_NAMES_FILE, AccountNameCache, AccountNames
+from .excel_sync import ReportWorkbook, WorkbookSource, iter_report_columns, workbook_size
+from .config import Config, load_env_file, get_config
+from .drive import DriveFolderIndex, build_drive_client, upload_file, upload_fileobj, find_file_id_by_name, download_to_fileobj, get_file_metadata
+from .drive_cache import CACHE_DIR_NAME, DriveFileCache
 from .mongo_fetch import (
-	fetch_orders_by_account,
-	fetch_account_name,
-	fetch_updated_order_ids_since,
-	fetch_orders_by_ids,
+	MongoSession,
+	iter_orders_partitioned,
+	order_key,
+	iter_changed_orders_since,
 	fetch_updated_logs_since,
 	fetch_recent_field_changes,
 )
-from .mongo_mapping import map_doc_to_report_row, REPORT_COLUMNS
+from .mongo_mapping import doc_to_report_tuple, iter_report_row_tuples, REPORT_COLUMNS
+from .metrics import AccountMetrics, RunMetrics
+from .state_store import STATE_DB_FILE, StateStore
+from .uploader import BackgroundUploader
+from .watch import RESUME_TOKEN_FILE, ResumeTokenStore, run_watch
+
+
+_log_lock = threading.Lock()
 
 
 def _append_log(output_dir: Path, line: str) -> None:
 	try:
 		output_dir.mkdir(parents=True, exist_ok=True)
 		log_path = output_dir / "order_sync.log"
-		with open(log_path, "a", encoding="utf-8") as f:
+		with _log_lock, open(log_path, "a", encoding="utf-8") as f:
 			f.write(line + "\n")
 	except Exception:
 		pass
 
 
-def cmd_mongo_auto(args: argparse.Namespace) -> int:
+@dataclass
+class AccountResult:
+	account_id: str
+	seconds: float
+	error: Optional[str] = None
+
+	@property
+	def ok(self) -> bool:
+		return self.error is None
+
+
+@dataclass
+class RunContext:
+	"""What every account of a run shares. index: the Drive folder listing (None: per-account
+	lookups); uploader: background uploads (None: inline); names: account names resolved for the run."""
+	cfg: Config
+	mongo: MongoSession
+	store: StateStore
+	output_dir: Path
+	utc_now: datetime
+	index: Optional[DriveFolderIndex] = None
+	uploader: Optional[BackgroundUploader] = None
+	names: Optional[AccountNames] = None
+	cache: DriveFileCache = field(init=False)
+
+	def __post_init__(self) -> None:
+		self.cache = DriveFileCache(self.output_dir / CACHE_DIR_NAME)
+
+
+# Drive clients (httplib2) are not thread-safe: one per worker thread
+_thread_state = threading.local()
+
+
+def _thread_drive_client(cfg: Config):
+	drive = getattr(_thread_state, "drive", None)
+	if drive is None:
+		drive = build_drive_client(cfg.drive_client_email, cfg.drive_private_key)
+		_thread_state.drive = drive
+	return drive
+
+
+def _ref_prefixes_for(cfg: Config, acc_id: str) -> List[str]:
+	"""REF prefixes to filter this account by (none for ACCOUNT_IDS_NO_PREFIX accounts)."""
+	if acc_id in cfg.account_ids_no_prefix:
+		return []
+	return cfg.ref_prefixes
+
+
+def _upload_workbook(cfg: Config, client, workbook: WorkbookSource, name: str, file_id: Optional[str], index: Optional[DriveFolderIndex]) -> Tuple[Dict[str, Any], str]:
+	if index is None:
+		file_id = find_file_id_by_name(client, cfg.drive_folder_id, name, max_retries=cfg.drive_max_retries)
+	# with a folder index the name is already resolved: update by id, or create without a lookup
+	if isinstance(workbook, Path):
+		meta, action = upload_file(client, workbook, cfg.drive_folder_id, file_id, chunk_size=cfg.drive_chunk_size, max_retries=cfg.drive_max_retries, name=name)
+	else:
+		meta, action = upload_fileobj(client, workbook, name, cfg.drive_folder_id, file_id, chunk_size=cfg.drive_chunk_size, max_retries=cfg.drive_max_retries)
+	if index is not None:
+		index.put(meta)
+	return meta, action
+
+
+def _upload_and_cache(run: RunContext, drive, report: ReportWorkbook, metrics: AccountMetrics, file_id: Optional[str]) -> None:
+	name = report.name
+
+	def upload(workbook: WorkbookSource, client) -> None:
+		with metrics.stage("upload"):
+			meta, action = _upload_workbook(run.cfg, client, workbook, name, file_id, run.index)
+		metrics.add_bytes("uploaded", workbook_size(workbook))
+		print(f"Drive {action}: {name}")
+		if meta.get("id"):
+			# the local state now matches this Drive revision
+			run.store.set_remote(metrics.account_id, meta)
+			if isinstance(workbook, Path):
+				# in-memory workbooks stay off disk: no local copy
+				run.cache.put(meta["id"], workbook, meta)
+
+	if run.uploader is None:
+		upload(report.source, drive)
+	else:
+		# the uploader thread needs its own Drive client
+		run.uploader.submit(metrics.account_id, report.detach(), lambda workbook: upload(workbook, _thread_drive_client(run.cfg)))
+
+
+def _render_report(store: StateStore, acc_id: str, report: ReportWorkbook, last_sync: datetime, metrics: AccountMetrics) -> None:
+	"""Write the account's whole workbook from the state store, sized by its recorded column lengths."""
+	with metrics.stage("state_store"):
+		state = store.get(acc_id)
+	lengths = state.column_lengths if state is not None else None
+	rows = metrics.timed_iter("state_store", store.iter_rows(acc_id, REPORT_COLUMNS))
+	with metrics.stage("workbook_write"):
+		count = report.rebuild(rows, REPORT_COLUMNS, last_sync, lengths)
+	metrics.add_count("rows_written", count)
+	metrics.add_bytes("workbook", report.size)
+
+
+# local file name of a run's workbook; the Drive name (from the account name) may not be a valid path
+_LOCAL_WORKBOOK_NAME = "report.xlsx"
+
+
+@contextmanager
+def _account_workbook(cfg: Config, name: str) -> Iterator[ReportWorkbook]:
+	"""The account's workbook for this run, named `name` in Drive: kept in memory (spilling to a temp
+	file past WORKBOOK_MEMORY_LIMIT bytes), or in a temp dir when the limit is 0."""
+	if cfg.workbook_memory_limit > 0:
+		with ReportWorkbook(Path(_LOCAL_WORKBOOK_NAME), memory_limit=cfg.workbook_memory_limit, name=name) as report:
+			yield report
+		return
+	with tempfile.TemporaryDirectory() as tmpdir:
+		with ReportWorkbook(Path(tmpdir) / _LOCAL_WORKBOOK_NAME, name=name) as report:
+			yield report
+
+
+def _full_rebuild(run: RunContext, drive, acc_id: str, filename_id: str, report: ReportWorkbook, metrics: AccountMetrics, file_id: Optional[str]) -> None:
+	"""Fetch the account's orders into the state store's rebuild staging (resuming after its checkpoint,
+	at most cfg.max_docs_per_run per run), then swap them in, render the workbook and upload it."""
+	cfg, store, utc_now = run.cfg, run.store, run.utc_now
+	metrics.mode = "full"
+	with metrics.stage("state_store"):
+		checkpoint = store.get_rebuild(acc_id)
+		if checkpoint is None or checkpoint.columns != REPORT_COLUMNS:
+			checkpoint = store.start_rebuild(acc_id, REPORT_COLUMNS, utc_now)
+		else:
+			metrics.add_count("rebuild_resumed_rows", checkpoint.row_count)
+	limit = cfg.max_docs_per_run
+	orders = iter_orders_partitioned(run.mongo, acc_id, after_key=checkpoint.last_key, limit=limit, workers=cfg.mongo_fetch_workers, ref_prefixes=_ref_prefixes_for(cfg, acc_id))
+	docs = metrics.timed_iter("order_fetch", orders, count="orders_fetched")
+	rows = metrics.timed_iter("map", ((doc_to_report_tuple(doc), doc) for doc in docs), count="rows_mapped")
+	with metrics.stage("state_store"):
+		staged = store.stage_rebuild_rows(acc_id, rows, REPORT_COLUMNS, key=order_key)
+	if limit and staged >= limit:
+		metrics.mode = "full_partial"
+		msg = f"[{utc_now.isoformat()}] Full rebuild for {filename_id} paused after {checkpoint.row_count + staged} orders (max {limit} per run), resuming next run"
+		print(msg)
+		_append_log(run.output_dir, msg)
+		return
+	with metrics.stage("state_store"):
+		created = store.finish_rebuild(acc_id)
+	last_sync = checkpoint.started_at
+	_render_report(store, acc_id, report, last_sync, metrics)
+	msg = f"[{utc_now.isoformat()}] Full generated for {filename_id}: created={created}, updated=0"
+	print(msg)
+	_append_log(run.output_dir, msg)
+	_upload_and_cache(run, drive, report, metrics, file_id)
+
+
+def _load_state_from_drive(run: RunContext, drive, acc_id: str, file_id: str, remote_meta: Dict[str, Any], report: ReportWorkbook, metrics: AccountMetrics) -> bool:
+	"""Rebuild the account's local state from its Drive workbook (cached copy if still current,
+	otherwise downloaded into the account's workbook). Returns False if the workbook has no report sheet."""
+	cfg, utc_now = run.cfg, run.utc_now
+	source = report
+	cached = run.cache.get(file_id, remote_meta)
+	if cached:
+		metrics.add_count("cache_hits", 1)
+		# only read: parse the cached copy in place
+		source = ReportWorkbook(cached.path)
+	else:
+		try:
+			with metrics.stage("download"):
+				with report.open_writer() as fh:
+					download_to_fileobj(drive, file_id, fh, chunk_size=cfg.drive_chunk_size, max_retries=cfg.drive_max_retries)
+			metrics.add_bytes("downloaded", report.size)
+		except Exception:
+			pass
+	with metrics.stage("workbook_read"):
+		if not source.has_report:
+			return False
+		last_sync = source.last_sync() or (utc_now.replace(year=utc_now.year - 1))
+	rows = metrics.timed_iter("workbook_read", iter_report_columns(source.source, REPORT_COLUMNS), count="rows_loaded")
+	with metrics.stage("state_store"):
+		run.store.replace_rows(acc_id, rows, REPORT_COLUMNS, last_sync, remote_meta)
+	return True
+
+
+def _account_name_cache(cfg: Config, output_dir: Path) -> AccountNameCache:
+	return AccountNameCache(output_dir / ACCOUNT_NAMES_FILE, ttl_seconds=cfg.account_name_ttl_seconds)
+
+
+def _sync_account(run: RunContext, drive, acc_id: str, metrics: Optional[AccountMetrics] = None) -> None:
+	"""Sync one account: full rebuild, or incremental upsert into the state store (reloaded from the
+	Drive copy when stale), then render and upload the workbook."""
+	cfg, mongo, store, index, output_dir, utc_now = run.cfg, run.mongo, run.store, run.index, run.output_dir, run.utc_now
+	if metrics is None:
+		metrics = AccountMetrics(acc_id)
+	with metrics.stage("account_lookup"):
+		names = run.names
+		if names is None:
+			names = _account_name_cache(cfg, output_dir).resolve(mongo, [acc_id])
+		filename_id = names.filename_id(acc_id)
+	remote_name = f"{filename_id}.xlsx"
+	remote_meta: Optional[Dict[str, Any]] = None
+	if index is not None:
+		remote_meta = index.get(remote_name)
+		file_id = remote_meta.get("id") if remote_meta else None
+	else:
+		with metrics.stage("drive_search"):
+			file_id = find_file_id_by_name(drive, cfg.drive_folder_id, remote_name, max_retries=cfg.drive_max_retries)
+	with _account_workbook(cfg, remote_name) as report:
+		if not file_id:
+			# no file in Drive → full
+			_full_rebuild(run, drive, acc_id, filename_id, report, metrics, None)
+			return
+		with metrics.stage("state_store"):
+			rebuilding = store.get_rebuild(acc_id) is not None
+		if rebuilding:
+			# a full rebuild was interrupted or paused: finish it before anything else
+			_full_rebuild(run, drive, acc_id, filename_id, report, metrics, file_id)
+			return
+		if remote_meta is None:
+			with metrics.stage("drive_search"):
+				remote_meta = get_file_metadata(drive, file_id, max_retries=cfg.drive_max_retries)
+		with metrics.stage("state_store"):
+			state = store.get(acc_id)
+		if state is None or not state.matches(remote_meta, REPORT_COLUMNS):
+			# first run on this host, a failed upload or an edit in Drive: reload from the Drive copy
+			metrics.add_count("state_reloads", 1)
+			if not _load_state_from_drive(run, drive, acc_id, file_id, remote_meta, report, metrics):
+				# full rebuild if report sheet is missing
+				_full_rebuild(run, drive, acc_id, filename_id, report, metrics, file_id)
+				return
+			state = store.get(acc_id)
+		# incremental flow
+		metrics.mode = "incremental"
+		last_sync = state.last_sync or (utc_now.replace(year=utc_now.year - 1))
+		with metrics.stage("orderlog_scan"):
+			changed_docs = list(iter_changed_orders_since(mongo, acc_id, since=last_sync, ref_prefixes=_ref_prefixes_for(cfg, acc_id)))
+		metrics.add_count("orders_changed", len(changed_docs))
+		if not changed_docs:
+			metrics.mode = "unchanged"
+			msg = f"[{utc_now.isoformat()}] No updates for {filename_id} since {last_sync.isoformat()}"
+			print(msg)
+			_append_log(output_dir, msg)
+			return
+		with metrics.stage("map"):
+			changed_rows = list(iter_report_row_tuples(changed_docs))
+		metrics.add_count("rows_mapped", len(changed_rows))
+		with metrics.stage("state_store"):
+			created_ids, updated_ids = store.upsert_rows(acc_id, changed_rows, REPORT_COLUMNS, utc_now)
+		metrics.add_count("rows_created", len(created_ids))
+		metrics.add_count("rows_updated", len(updated_ids))
+		_render_report(store, acc_id, report, utc_now, metrics)
+		msg = f"[{utc_now.isoformat()}] Incremental for {filename_id}: created={len(created_ids)}, updated={len(updated_ids)}"
+		print(msg)
+		_append_log(output_dir, msg)
+		if updated_ids:
+			with metrics.stage("orderlog_scan"):
+				changes = fetch_recent_field_changes(mongo, acc_id, since=last_sync, order_ids=updated_ids)
+			for oid, entries in changes:
+				for e in entries:
+					_append_log(output_dir, f"  ~ {oid} {e.get('action')} @ {e.get('date')}: " + ", ".join([f"{c.get('field')}: {c.get('old')} -> {c.get('new')}" for c in e.get('changes', [])]))
+		_upload_and_cache(run, drive, report, metrics, file_id)
+
+
+def _run_account(run: RunContext, acc_id: str, run_metrics: Optional[RunMetrics] = None) -> AccountResult:
+	"""Sync one account, isolating failures so the rest of the run continues."""
+	utc_now = run.utc_now
+	metrics = run_metrics.account(acc_id) if run_metrics is not None else AccountMetrics(acc_id)
+	started = time.perf_counter()
+	try:
+		_sync_account(run, _thread_drive_client(run.cfg), acc_id, metrics)
+	except Exception as e:
+		elapsed = time.perf_counter() - started
+		metrics.total_seconds = elapsed
+		metrics.error = f"{type(e).__name__}: {e}"
+		msg = f"[{utc_now.isoformat()}] ERROR for {acc_id}: {type(e).__name__}: {e}"
+		print(msg, file=sys.stderr)
+		_append_log(run.output_dir, msg)
+		return AccountResult(acc_id, elapsed, error=f"{type(e).__name__}: {e}")
+	metrics.total_seconds = time.perf_counter() - started
+	return AccountResult(acc_id, metrics.total_seconds)
+
+
+def _print_summary(results: List[AccountResult], output_dir: Path, utc_now: datetime) -> None:
+	failed = [r for r in results if not r.ok]
+	lines = [f"[{utc_now.isoformat()}] Summary: ok={len(results) - len(failed)}, failed={len(failed)}"]
+	for r in results:
+		status = "ok" if r.ok else f"FAILED ({r.error})"
+		lines.append(f"  {r.account_id}: {r.seconds:.2f}s {status}")
+	for line in lines:
+		print(line)
+		_append_log(output_dir, line)
+
+
+def _prepare_run(args: argparse.Namespace) -> Tuple[Optional[Config], Any, List[str]]:
+	"""Validate env config, build the Drive client and resolve the accounts to sync.
+	Prints the problem and returns (None, None, []) when the run cannot start."""
 	cfg = get_config()
 	if not cfg.mongo_uri:
 		print("ERROR: MONGO_URI must be set in env/.env", file=sys.stderr)
-		return 2
+		return None, None, []
 
 	drive_client = None
 	if cfg.drive_client_email and cfg.drive_private_key and cfg.drive_folder_id:
@@ -47,7 +344,7 @@ def cmd_mongo_auto(args: argparse.Namespace) -> int:
 
 	if not drive_client or not cfg.drive_folder_id:
 		print("ERROR: Drive must be configured (GOOGLE_CLIENT_EMAIL, GOOGLE_PRIVATE_KEY, GOOGLE_DRIVE_FOLDER_ID)", file=sys.stderr)
-		return 2
+		return None, None, []
 
 	account_ids: List[str] = []
 	if args.account_id:
@@ -56,82 +353,137 @@ def cmd_mongo_auto(args: argparse.Namespace) -> int:
 		account_ids = cfg.account_ids
 	else:
 		print("ERROR: Provide --account-id or set ACCOUNT_IDS in env", file=sys.stderr)
+		return None, None, []
+	return cfg, drive_client, account_ids
+
+
+def _open_mongo(cfg: Config, account_workers: int = 1) -> MongoSession:
+	# every account worker may run mongo_fetch_workers range cursors at once
+	return MongoSession(
+		cfg.mongo_uri,
+		max_pool_size=max(cfg.mongo_max_pool_size, account_workers * max(1, cfg.mongo_fetch_workers)),
+		connect_timeout_ms=cfg.mongo_connect_timeout_ms,
+		server_selection_timeout_ms=cfg.mongo_server_selection_timeout_ms,
+		socket_timeout_ms=cfg.mongo_socket_timeout_ms,
+	)
+
+
+def _utc_now() -> datetime:
+	return datetime.now(timezone.utc).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _apply_upload_results(uploader: BackgroundUploader, results: List[AccountResult], run_metrics: RunMetrics, output_dir: Path, utc_now: datetime) -> None:
+	"""Wait for pending uploads and charge their time and failures to their accounts."""
+	errors = uploader.close()
+	metrics_by_account = {m.account_id: m for m in run_metrics.accounts}
+	for r in results:
+		r.seconds += uploader.seconds.get(r.account_id, 0.0)
+		m = metrics_by_account.get(r.account_id)
+		if m is not None:
+			m.total_seconds = r.seconds
+		error = errors.get(r.account_id)
+		if error is None or not r.ok:
+			continue
+		r.error = error
+		if m is not None:
+			m.error = error
+		msg = f"[{utc_now.isoformat()}] ERROR for {r.account_id} (upload): {error}"
+		print(msg, file=sys.stderr)
+		_append_log(output_dir, msg)
+
+
+def _load_folder_index(cfg: Config, drive_client) -> Optional[DriveFolderIndex]:
+	"""List the Drive folder once for the run; None (per-account lookups) if the listing fails."""
+	try:
+		return DriveFolderIndex.load(drive_client, cfg.drive_folder_id, max_retries=cfg.drive_max_retries)
+	except Exception as e:
+		print(f"WARN: Could not list Drive folder, falling back to per-file lookups: {e}", file=sys.stderr)
+		return None
+
+
+def cmd_mongo_auto(args: argparse.Namespace) -> int:
+	cfg, drive_client, account_ids = _prepare_run(args)
+	if cfg is None:
 		return 2
 
+	if args.max_docs_per_run is not None:
+		cfg = replace(cfg, max_docs_per_run=args.max_docs_per_run or None)
+	if args.fetch_workers is not None:
+		cfg = replace(cfg, mongo_fetch_workers=max(1, args.fetch_workers))
 	output_dir = Path(args.output_dir or cfg.output_dir)
-	utc_now = datetime.now(timezone.utc).astimezone(timezone.utc).replace(tzinfo=None)
-	for acc_id in account_ids:
-		acc_name = fetch_account_name(cfg.mongo_uri, acc_id)
-		filename_id = acc_name if acc_name else acc_id
-		remote_name = f"{filename_id}.xlsx"
-		file_id = find_file_id_by_name(drive_client, cfg.drive_folder_id, remote_name)
-		with tempfile.TemporaryDirectory() as tmpdir:
-			tmp_path = Path(tmpdir) / remote_name
-			if file_id:
-				# download and decide full vs incremental based on 'report' sheet presence
-				try:
-					download_file(drive_client, file_id, tmp_path)
-				except Exception:
-					pass
-				has_report = False
-				try:
-					wb = load_workbook(filename=str(tmp_path))
-					has_report = ("report" in wb.sheetnames)
-				except Exception:
-					has_report = False
-				if not has_report:
-					# full rebuild if report sheet is missing
-					all_docs = fetch_orders_by_account(cfg.mongo_uri, acc_id)
-					all_rows = [map_doc_to_report_row(d) for d in all_docs]
-					if acc_id not in cfg.account_ids_no_prefix and cfg.ref_prefixes:
-						all_rows = [r for r in all_rows if isinstance(r.get("REF"), str) and any(r.get("REF", "").startswith(p) for p in cfg.ref_prefixes)]
-					wb_path = write_report_for_user(filename_id, all_rows, REPORT_COLUMNS, Path(tmpdir))
-					write_last_sync(wb_path, utc_now)
-					msg = f"[{utc_now.isoformat()}] Full generated for {filename_id}: created={len(all_rows)}, updated=0"
-					print(msg)
-					_append_log(output_dir, msg)
-					_, action = upload_or_update_file(drive_client, wb_path, cfg.drive_folder_id)
-					print(f"Drive {action}: {remote_name}")
-					continue
-				# incremental flow
-				last_sync = read_last_sync(tmp_path) or (utc_now.replace(year=utc_now.year - 1))
-				order_ids = fetch_updated_order_ids_since(cfg.mongo_uri, acc_id, since=last_sync)
-				if not order_ids:
-					msg = f"[{utc_now.isoformat()}] No updates for {filename_id} since {last_sync.isoformat()}"
-					print(msg)
-					_append_log(output_dir, msg)
-					continue
-				docs = fetch_orders_by_ids(cfg.mongo_uri, order_ids)
-				changed_rows = [map_doc_to_report_row(d) for d in docs]
-				if acc_id not in cfg.account_ids_no_prefix and cfg.ref_prefixes:
-					changed_rows = [r for r in changed_rows if isinstance(r.get("REF"), str) and any(r.get("REF", "").startswith(p) for p in cfg.ref_prefixes)]
-				wb_path, created_ids, updated_ids = upsert_report_for_user_with_stats(filename_id, changed_rows, REPORT_COLUMNS, Path(tmpdir))
-				write_last_sync(wb_path, utc_now)
-				msg = f"[{utc_now.isoformat()}] Incremental for {filename_id}: created={len(created_ids)}, updated={len(updated_ids)}"
-				print(msg)
-				_append_log(output_dir, msg)
-				if updated_ids:
-					changes = fetch_recent_field_changes(cfg.mongo_uri, acc_id, since=last_sync, order_ids=updated_ids[:50])
-					for oid, entries in changes:
-						for e in entries:
-							_append_log(output_dir, f"  ~ {oid} {e.get('action')} @ {e.get('date')}: " + ", ".join([f"{c.get('field')}: {c.get('old')} -> {c.get('new')}" for c in e.get('changes', [])]))
-				_, action = upload_or_update_file(drive_client, wb_path, cfg.drive_folder_id)
-				print(f"Drive {action}: {remote_name}")
-			else:
-				# no file in Drive → full
-				all_docs = fetch_orders_by_account(cfg.mongo_uri, acc_id)
-				all_rows = [map_doc_to_report_row(d) for d in all_docs]
-				if acc_id not in cfg.account_ids_no_prefix and cfg.ref_prefixes:
-					all_rows = [r for r in all_rows if isinstance(r.get("REF"), str) and any(r.get("REF", "").startswith(p) for p in cfg.ref_prefixes)]
-				wb_path = write_report_for_user(filename_id, all_rows, REPORT_COLUMNS, Path(tmpdir))
-				write_last_sync(wb_path, utc_now)
-				msg = f"[{utc_now.isoformat()}] Full generated for {filename_id}: created={len(all_rows)}, updated=0"
-				print(msg)
-				_append_log(output_dir, msg)
-				_, action = upload_or_update_file(drive_client, wb_path, cfg.drive_folder_id)
-				print(f"Drive {action}: {remote_name}")
+	utc_now = _utc_now()
+	workers = max(1, int(args.workers or 1))
+	mongo = _open_mongo(cfg, workers)
+	_thread_state.drive = drive_client
+	run_metrics = RunMetrics(utc_now)
+	index = _load_folder_index(cfg, drive_client)
+	results: List[AccountResult] = []
+	with mongo, StateStore(output_dir / STATE_DB_FILE) as store:
+		# every account's name in one query (or from the cache)
+		names = _account_name_cache(cfg, output_dir).resolve(mongo, account_ids, refresh=args.refresh_account_names)
+		run = RunContext(cfg, mongo, store, output_dir, utc_now, index=index, names=names)
+		if workers == 1:
+			# upload account N in the background while account N+1 is fetched and built
+			uploader = BackgroundUploader(args.upload_queue) if args.upload_queue > 0 else None
+			run = replace(run, uploader=uploader)
+			try:
+				for acc_id in account_ids:
+					results.append(_run_account(run, acc_id, run_metrics))
+			finally:
+				if uploader is not None:
+					_apply_upload_results(uploader, results, run_metrics, output_dir, utc_now)
+		else:
+			with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="order-sync") as pool:
+				futures = [pool.submit(_run_account, run, acc_id, run_metrics) for acc_id in account_ids]
+				results = [f.result() for f in futures]
 
+	_print_summary(results, output_dir, utc_now)
+	try:
+		run_metrics.export(output_dir)
+	except OSError as e:
+		print(f"WARN: Could not write run metrics: {e}", file=sys.stderr)
 	print(f"Auto sync processed {len(account_ids)} account(s)")
+	return 1 if any(not r.ok for r in results) else 0
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+	cfg, drive_client, account_ids = _prepare_run(args)
+	if cfg is None:
+		return 2
+
+	output_dir = Path(args.output_dir or cfg.output_dir)
+	_thread_state.drive = drive_client
+	stop = threading.Event()
+	signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+	def log(line: str) -> None:
+		print(line)
+		_append_log(output_dir, line)
+
+	with _open_mongo(cfg) as mongo, StateStore(output_dir / STATE_DB_FILE) as store:
+		def sync(acc_id: str) -> bool:
+			result = _run_account(RunContext(cfg, mongo, store, output_dir, _utc_now()), acc_id)
+			log(f"[{_utc_now().isoformat()}] watch sync {acc_id}: {result.seconds:.2f}s {'ok' if result.ok else 'FAILED'}")
+			return result.ok
+
+		# warm the account name cache; each sync then reads it (and refreshes entries past the TTL)
+		_account_name_cache(cfg, output_dir).resolve(mongo, account_ids, refresh=args.refresh_account_names)
+		log(f"[{_utc_now().isoformat()}] Watching OrderLog for {len(account_ids)} account(s)")
+		try:
+			run_watch(
+				mongo,
+				account_ids,
+				sync,
+				ResumeTokenStore(output_dir / RESUME_TOKEN_FILE),
+				debounce=args.debounce,
+				max_delay=args.max_delay,
+				retry_delay=args.retry_delay,
+				should_stop=stop.is_set,
+				log=log,
+			)
+		except KeyboardInterrupt:
+			pass
+	log(f"[{_utc_now().isoformat()}] Watch stopped")
 	return 0
 
 
@@ -144,7 +496,21 @@ def build_parser() -> argparse.ArgumentParser:
 	pa.add_argument("--account-id", help="Mongo ObjectId of account. If omitted, reads ACCOUNT_IDS from env.")
 	pa.add_argument("--output-dir", default=None)
 	pa.add_argument("--verbose", action="store_true")
+	pa.add_argument("--workers", type=int, default=1, help="Accounts processed concurrently (default 1, sequential)")
+	pa.add_argument("--upload-queue", type=int, default=2, help="Sequential runs: finished workbooks waiting for the background uploader before the next account blocks (0 uploads inline)")
+	pa.add_argument("--fetch-workers", type=int, default=None, help="Full rebuilds: concurrent createdAt range cursors per account (default MONGO_FETCH_WORKERS env, 1)")
+	pa.add_argument("--max-docs-per-run", type=int, default=None, help="Full rebuilds fetch at most this many orders per account and run, resuming on the next run (default MAX_DOCS_PER_RUN env, unlimited; 0 = unlimited)")
+	pa.add_argument("--refresh-account-names", action="store_true", help="Look up every account name in Mongo instead of using the cache in OUTPUT_DIR")
 	pa.set_defaults(func=cmd_mongo_auto)
+
+	pw = sub.add_parser("watch", help="Daemon: follow OrderLog via change stream and sync touched accounts (needs a replica set)")
+	pw.add_argument("--account-id", help="Mongo ObjectId of account. If omitted, reads ACCOUNT_IDS from env.")
+	pw.add_argument("--output-dir", default=None)
+	pw.add_argument("--debounce", type=float, default=5.0, help="Seconds an account must be quiet before syncing (default 5)")
+	pw.add_argument("--max-delay", type=float, default=60.0, help="Max seconds an account's changes wait under continuous activity (default 60)")
+	pw.add_argument("--retry-delay", type=float, default=30.0, help="Seconds before retrying an account whose sync failed, doubling per consecutive failure up to 15 minutes (default 30)")
+	pw.add_argument("--refresh-account-names", action="store_true", help="Look up every account name in Mongo at startup instead of using the cache in OUTPUT_DIR")
+	pw.set_defaults(func=cmd_watch)
 	return p
 
 
@@ -20,6 +20,22 @@ class Config:
 	# Filtering config
 	ref_prefixes: List[str]
 	account_ids_no_prefix: List[str]
+	# Mongo connection pool (one client per run)
+	mongo_max_pool_size: int = 10
+	mongo_connect_timeout_ms: int = 10000
+	mongo_server_selection_timeout_ms: int = 15000
+	mongo_socket_timeout_ms: Optional[int] = None
+	# Full rebuilds read an account's orders with this many concurrent range cursors (1: one cursor)
+	mongo_fetch_workers: int = 1
+	# Drive transfers: chunk size in bytes (rounded up to 256 KiB) and retries on 429/5xx
+	drive_chunk_size: int = 8 * 1024 * 1024
+	drive_max_retries: int = 5
+	# Workbooks are kept in memory up to this many bytes, then spill to a temp file (0: always temp files)
+	workbook_memory_limit: int = 64 * 1024 * 1024
+	# Full rebuilds fetch at most this many orders per account and run, resuming on the next one (None: no limit)
+	max_docs_per_run: Optional[int] = None
+	# Account names are cached in OUTPUT_DIR and looked up again after this many seconds
+	account_name_ttl_seconds: int = 24 * 3600
 
 
 DEFAULT_OUTPUT_DIR = "./order_sync_output"
@@ -42,6 +58,16 @@ def _split_csv(name: str) -> List[str]:
 	return [s.strip() for s in val.split(",") if s.strip()]
 
 
+def _int_env(name: str, default: Optional[int]) -> Optional[int]:
+	val = os.getenv(name, "").strip()
+	if not val:
+		return default
+	try:
+		return int(val)
+	except ValueError:
+		return default
+
+
 def get_config() -> Config:
 	account_ids_raw = os.getenv("ACCOUNT_IDS", "").strip()
 	account_ids = [s.strip() for s in account_ids_raw.split(",") if s.strip()]
@@ -57,4 +83,14 @@ def get_config() -> Config:
 		account_ids=account_ids,
 		ref_prefixes=prefixes,
 		account_ids_no_prefix=no_prefix_ids,
+		mongo_max_pool_size=_int_env("MONGO_MAX_POOL_SIZE", 10),
+		mongo_connect_timeout_ms=_int_env("MONGO_CONNECT_TIMEOUT_MS", 10000),
+		mongo_server_selection_timeout_ms=_int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 15000),
+		mongo_socket_timeout_ms=_int_env("MONGO_SOCKET_TIMEOUT_MS", None),
+		mongo_fetch_workers=_int_env("MONGO_FETCH_WORKERS", 1),
+		drive_chunk_size=_int_env("DRIVE_CHUNK_SIZE", 8 * 1024 * 1024),
+		drive_max_retries=_int_env("DRIVE_MAX_RETRIES", 5),
+		workbook_memory_limit=_int_env("WORKBOOK_MEMORY_LIMIT", 64 * 1024 * 1024),
+		max_docs_per_run=_int_env("MAX_DOCS_PER_RUN", None),
+		account_name_ttl_seconds=_int_env("ACCOUNT_NAME_TTL_SECONDS", 24 * 3600),
 	)
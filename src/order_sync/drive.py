@@ -1,14 +1,34 @@
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple, Optional, TypeVar
+import io
+import random
+import socket
+import threading
+import time
 
+import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-import io
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload
 
 
 DRIVE_SCOPE = ["https://www.googleapis.com/auth/drive.file"]
 TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Metadata used to tell whether a remote workbook changed without downloading it
+FILE_META_FIELDS = "id,name,md5Checksum,modifiedTime,headRevisionId"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Resumable transfers move data in chunks; Drive requires multiples of 256 KiB
+CHUNK_GRANULARITY = 256 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+
+T = TypeVar("T")
 
 
 def build_drive_client(client_email: str, private_key: str):
@@ -24,54 +44,190 @@ def build_drive_client(client_email: str, private_key: str):
 	return build("drive", "v3", credentials=creds, cache_discovery=False)
 
 
-def find_file_id_by_name(drive, folder_id: str, name: str) -> Optional[str]:
+def normalize_chunk_size(chunk_size: int) -> int:
+	"""Round chunk_size up to the 256 KiB multiple Drive expects (at least one unit)."""
+	units = max(1, -(-int(chunk_size) // CHUNK_GRANULARITY))
+	return units * CHUNK_GRANULARITY
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+	"""Transient failures worth retrying: 429/5xx, 403 rate limits and transport errors."""
+	if isinstance(exc, HttpError):
+		status = getattr(exc.resp, "status", None)
+		if status in RETRY_STATUSES:
+			return True
+		if status == 403:
+			reasons = {d.get("reason") for d in (exc.error_details or []) if isinstance(d, dict)}
+			return bool(reasons & RATE_LIMIT_REASONS)
+		return False
+	# socket.timeout is only an alias of TimeoutError from Python 3.10
+	return isinstance(exc, (httplib2.HttpLib2Error, ConnectionError, TimeoutError, socket.timeout))
+
+
+def is_rejected_request_error(exc: BaseException) -> bool:
+	"""Retryable errors Drive answered with a 429/5xx or a rate limit, as opposed to transport errors
+	and timeouts, after which the request may have been applied. Only these are retried for requests
+	that are not idempotent (a file create)."""
+	return isinstance(exc, HttpError) and is_retryable_error(exc)
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+	"""Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt))."""
+	return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def with_retries(fn: Callable[[], T], max_retries: int = DEFAULT_MAX_RETRIES, sleep: Callable[[float], None] = time.sleep, retryable: Callable[[BaseException], bool] = is_retryable_error) -> T:
+	"""Call fn, retrying transient Drive errors (those `retryable` accepts) up to max_retries times
+	with jittered backoff."""
+	attempt = 0
+	while True:
+		try:
+			return fn()
+		except Exception as e:
+			if attempt >= max_retries or not retryable(e):
+				raise
+			sleep(backoff_delay(attempt))
+			attempt += 1
+
+
+def find_file_id_by_name(drive, folder_id: str, name: str, max_retries: int = DEFAULT_MAX_RETRIES) -> Optional[str]:
 	q = f"name = '{name}' and '{folder_id}' in parents and trashed = false"
-	res = drive.files().list(
+	req = drive.files().list(
 		q=q,
 		spaces="drive",
 		fields="files(id,name)",
 		includeItemsFromAllDrives=True,
 		supportsAllDrives=True,
-	).execute()
+	)
+	res = with_retries(req.execute, max_retries)
 	files = res.get("files", [])
 	return files[0]["id"] if files else None
 
 
-def download_file(drive, file_id: str, dest_path: Path) -> Path:
+def get_file_metadata(drive, file_id: str, max_retries: int = DEFAULT_MAX_RETRIES) -> Dict[str, Any]:
+	req = drive.files().get(fileId=file_id, fields=FILE_META_FIELDS, supportsAllDrives=True)
+	return with_retries(req.execute, max_retries)
+
+
+def download_to_fileobj(drive, file_id: str, fh: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> int:
+	"""Download into fh (e.g. an in-memory buffer) in chunk_size ranges. A failed chunk is retried
+	from the last completed offset. Returns the number of bytes written."""
+	start = fh.tell()
 	req = drive.files().get_media(fileId=file_id, supportsAllDrives=True)
-	fh = io.FileIO(str(dest_path), mode="wb")
-	downloader = MediaIoBaseDownload(fh, req)
+	downloader = MediaIoBaseDownload(fh, req, chunksize=normalize_chunk_size(chunk_size))
 	done = False
 	while not done:
-		status, done = downloader.next_chunk()
+		status, done = with_retries(downloader.next_chunk, max_retries)
+	return fh.tell() - start
+
+
+def download_file(drive, file_id: str, dest_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> Path:
+	with io.FileIO(str(dest_path), mode="wb") as fh:
+		download_to_fileobj(drive, file_id, fh, chunk_size=chunk_size, max_retries=max_retries)
 	return dest_path
 
 
-def upload_or_update_file(drive, file_path: Path, folder_id: str) -> Tuple[str, str]:
-	name = file_path.name
-	q = f"name = '{name}' and '{folder_id}' in parents and trashed = false"
-	res = drive.files().list(
-		q=q,
-		spaces="drive",
-		fields="files(id,name)",
-		includeItemsFromAllDrives=True,
-		supportsAllDrives=True,
-	).execute()
-	files = res.get("files", [])
-	media = MediaFileUpload(str(file_path), mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", resumable=False)
-	if files:
-		file_id = files[0]["id"]
-		drive.files().update(fileId=file_id, media_body=media, supportsAllDrives=True).execute()
-		return file_id, "updated"
+def _execute_upload(request, resumable: bool, max_retries: int, creates: bool = False) -> Dict[str, Any]:
+	if not resumable:
+		# a create that timed out may still have created the file: retrying it could leave two
+		# files with the same name, so only retry when Drive rejected the request
+		retryable = is_rejected_request_error if creates else is_retryable_error
+		return with_retries(request.execute, max_retries, retryable=retryable)
+	# each next_chunk sends one chunk; after an error it first asks Drive how much it already has
+	# (a resumable session creates the file once, so this is safe for creates too)
+	response = None
+	while response is None:
+		status, response = with_retries(request.next_chunk, max_retries)
+	return response
+
+
+def _upload_media(drive, media, name: str, folder_id: str, file_id: Optional[str], resumable: bool, max_retries: int) -> Tuple[Dict[str, Any], str]:
+	if file_id:
+		request = drive.files().update(fileId=file_id, media_body=media, fields=FILE_META_FIELDS, supportsAllDrives=True)
+		return _execute_upload(request, resumable, max_retries), "updated"
 	metadata = {
 		"name": name,
 		"parents": [folder_id],
-		"mimeType": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+		"mimeType": XLSX_MIME,
 	}
-	created = drive.files().create(
+	request = drive.files().create(
 		body=metadata,
 		media_body=media,
-		fields="id",
+		fields=FILE_META_FIELDS,
 		supportsAllDrives=True,
-	).execute()
-	return created.get("id"), "created"
+	)
+	return _execute_upload(request, resumable, max_retries, creates=True), "created"
+
+
+def upload_file(drive, file_path: Path, folder_id: str, file_id: Optional[str], chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = DEFAULT_MAX_RETRIES, name: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+	"""Update file_id with file_path, or create it in folder_id when file_id is None, named `name` in
+	Drive (default file_path's name); resumable past one chunk. Returns (file metadata, "created"|"updated")."""
+	chunk_size = normalize_chunk_size(chunk_size)
+	resumable = file_path.stat().st_size > chunk_size
+	media = MediaFileUpload(str(file_path), mimetype=XLSX_MIME, chunksize=chunk_size, resumable=resumable)
+	return _upload_media(drive, media, name or file_path.name, folder_id, file_id, resumable, max_retries)
+
+
+def upload_fileobj(drive, fh: BinaryIO, name: str, folder_id: str, file_id: Optional[str], chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> Tuple[Dict[str, Any], str]:
+	"""Like upload_file, reading the workbook from a seekable file object (e.g. an in-memory
+	buffer) named `name` in Drive."""
+	chunk_size = normalize_chunk_size(chunk_size)
+	size = fh.seek(0, io.SEEK_END)
+	fh.seek(0)
+	resumable = size > chunk_size
+	media = MediaIoBaseUpload(fh, mimetype=XLSX_MIME, chunksize=chunk_size, resumable=resumable)
+	return _upload_media(drive, media, name, folder_id, file_id, resumable, max_retries)
+
+
+def upload_or_update_file(drive, file_path: Path, folder_id: str, chunk_size: int = DEFAULT_CHUNK_SIZE, max_retries: int = DEFAULT_MAX_RETRIES) -> Tuple[Dict[str, Any], str]:
+	"""Upload file_path into folder_id, replacing a same-named file. Returns (file metadata, "created"|"updated")."""
+	file_id = find_file_id_by_name(drive, folder_id, file_path.name, max_retries=max_retries)
+	return upload_file(drive, file_path, folder_id, file_id, chunk_size=chunk_size, max_retries=max_retries)
+
+
+class DriveFolderIndex:
+	"""Name -> metadata (FILE_META_FIELDS) of every file in a Drive folder, listed once per run and
+	kept current with put(). Thread-safe."""
+
+	def __init__(self, folder_id: str, files: List[Dict[str, Any]]) -> None:
+		self.folder_id = folder_id
+		self._lock = threading.Lock()
+		self._by_name: Dict[str, Dict[str, Any]] = {}
+		for meta in files:
+			# same-named duplicates: keep the first one listed, like find_file_id_by_name
+			self._by_name.setdefault(meta.get("name"), meta)
+
+	@classmethod
+	def load(cls, drive, folder_id: str, page_size: int = 1000, max_retries: int = DEFAULT_MAX_RETRIES) -> "DriveFolderIndex":
+		files: List[Dict[str, Any]] = []
+		page_token: Optional[str] = None
+		while True:
+			req = drive.files().list(
+				q=f"'{folder_id}' in parents and trashed = false",
+				spaces="drive",
+				fields=f"nextPageToken,files({FILE_META_FIELDS})",
+				pageSize=page_size,
+				pageToken=page_token,
+				includeItemsFromAllDrives=True,
+				supportsAllDrives=True,
+			)
+			res = with_retries(req.execute, max_retries)
+			files.extend(res.get("files", []))
+			page_token = res.get("nextPageToken")
+			if not page_token:
+				break
+		return cls(folder_id, files)
+
+	def __len__(self) -> int:
+		with self._lock:
+			return len(self._by_name)
+
+	def get(self, name: str) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			return self._by_name.get(name)
+
+	def put(self, meta: Dict[str, Any]) -> None:
+		if not meta.get("name"):
+			return
+		with self._lock:
+			self._by_name[meta["name"]] = meta
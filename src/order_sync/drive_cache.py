@@ -0,0 +1,85 @@
+import json
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .utils import atomic_write
+
+
+CACHE_DIR_NAME = "drive_cache"
+
+
+@dataclass
+class CacheEntry:
+	file_id: str
+	path: Path
+	md5: Optional[str]
+	head_revision_id: Optional[str]
+
+	def matches(self, meta: Dict[str, Any]) -> bool:
+		"""True if the remote metadata describes the same content as the cached copy."""
+		rev = meta.get("headRevisionId")
+		if rev and self.head_revision_id:
+			return rev == self.head_revision_id
+		md5 = meta.get("md5Checksum")
+		return bool(md5) and md5 == self.md5
+
+
+class DriveFileCache:
+	"""Local copies of uploaded Drive workbooks keyed by file id, with the md5Checksum/headRevisionId
+	they correspond to. Stale entries are evicted when looked up."""
+
+	def __init__(self, root: Path) -> None:
+		self.root = root
+
+	def _xlsx_path(self, file_id: str) -> Path:
+		return self.root / f"{file_id}.xlsx"
+
+	def _meta_path(self, file_id: str) -> Path:
+		return self.root / f"{file_id}.json"
+
+	def get(self, file_id: str, meta: Dict[str, Any]) -> Optional[CacheEntry]:
+		"""Return the cached entry for file_id if it is still current for the given remote metadata;
+		a stale entry is discarded (revisions only move forward, so it can never match again)."""
+		xlsx_path = self._xlsx_path(file_id)
+		try:
+			with open(self._meta_path(file_id), "r", encoding="utf-8") as f:
+				raw = json.load(f)
+		except (OSError, ValueError):
+			return None
+		if not xlsx_path.exists():
+			self.discard(file_id)
+			return None
+		entry = CacheEntry(
+			file_id=file_id,
+			path=xlsx_path,
+			md5=raw.get("md5Checksum"),
+			head_revision_id=raw.get("headRevisionId"),
+		)
+		if not entry.matches(meta):
+			self.discard(file_id)
+			return None
+		return entry
+
+	def put(self, file_id: str, src_path: Path, meta: Dict[str, Any]) -> None:
+		"""Store src_path as the current copy of file_id. Writes are atomic (temp file + rename)."""
+		with open(src_path, "rb") as src, atomic_write(self._xlsx_path(file_id), "wb") as f:
+			shutil.copyfileobj(src, f)
+		raw = {
+			"file_id": file_id,
+			"name": meta.get("name"),
+			"md5Checksum": meta.get("md5Checksum"),
+			"headRevisionId": meta.get("headRevisionId"),
+			"modifiedTime": meta.get("modifiedTime"),
+		}
+		with atomic_write(self._meta_path(file_id)) as f:
+			json.dump(raw, f)
+
+	def discard(self, file_id: str) -> None:
+		"""Remove file_id's cached copy and metadata, if any."""
+		for p in (self._xlsx_path(file_id), self._meta_path(file_id)):
+			try:
+				p.unlink()
+			except OSError:
+				pass
@@ -1,14 +1,26 @@
 import json
+import tempfile
+import warnings
+import zipfile
+from contextlib import contextmanager
+from itertools import chain, islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from xml.etree import ElementTree
 
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.styles import Alignment
+from openpyxl.styles import Alignment, NamedStyle
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel
 from openpyxl.workbook.protection import WorkbookProtection
 from datetime import datetime
 
+from .mongo_mapping import ReportRow, RowLike, row_type_for, row_values
+
 
 COLUMNS = [
 	"order_id",
@@ -24,11 +36,51 @@ SHEET_NAME = "orders"
 # Report sheet for Mongo mapping
 REPORT_SHEET_NAME = "report"
 META_SHEET_NAME = "meta"
+REPORT_TABLE_NAME = "ReportTable"
+REPORT_DATE_COLUMNS = [
+	"ETD (fecha)",
+	"ETA (fecha)",
+	"Fecha de ISF",
+	"Fecha de customs clearance",
+	"Fecha de empty return",
+]
+REPORT_HIDDEN_COLUMNS = ["orderId", "__createdAt", "__lastUpdateAt"]
+# Named cell style (left aligned) shared by the date columns
+REPORT_DATE_STYLE = "ReportDate"
+# Rows buffered by the streaming writer to size columns when their lengths are not known up front
+# (write-only sheets need widths before the first row)
+WIDTH_SAMPLE_ROWS = 1000
+
+# A workbook on disk, or its bytes in a seekable file object (e.g. an in-memory buffer)
+WorkbookSource = Union[Path, BinaryIO]
+
+
+def _source_exists(source: WorkbookSource) -> bool:
+	if isinstance(source, Path):
+		return source.exists()
+	return workbook_size(source) > 0
+
+
+def _source_arg(source: WorkbookSource) -> Any:
+	"""What zipfile/openpyxl should open: the path as str, or the file object rewound."""
+	if isinstance(source, Path):
+		return str(source)
+	source.seek(0)
+	return source
 
 
-def ensure_workbook(path: Path) -> Workbook:
-	if path.exists():
-		wb = load_workbook(filename=str(path))
+def workbook_size(source: WorkbookSource) -> int:
+	if isinstance(source, Path):
+		return source.stat().st_size
+	pos = source.tell()
+	size = source.seek(0, 2)
+	source.seek(pos)
+	return size
+
+
+def ensure_workbook(path: WorkbookSource) -> Workbook:
+	if _source_exists(path):
+		wb = load_workbook(filename=_source_arg(path))
 		# keep meta hidden if present
 		if META_SHEET_NAME in wb.sheetnames:
 			wb[META_SHEET_NAME].sheet_state = "veryHidden"
@@ -115,10 +167,7 @@ def upsert_orders_for_user(user_id: str, orders: List[Dict[str, Any]], output_di
 	return wb_path
 
 
-def read_last_sync(path: Path) -> Optional[datetime]:
-	if not path.exists():
-		return None
-	wb = load_workbook(filename=str(path))
+def _meta_last_sync(wb: Workbook) -> Optional[datetime]:
 	if META_SHEET_NAME not in wb.sheetnames:
 		return None
 	ws = wb[META_SHEET_NAME]
@@ -130,12 +179,9 @@ def read_last_sync(path: Path) -> Optional[datetime]:
 		return None
 
 
-def write_last_sync(path: Path, when: datetime) -> None:
-	wb = ensure_workbook(path)
+def _set_meta_last_sync(wb: Workbook, when: datetime) -> None:
 	if META_SHEET_NAME in wb.sheetnames:
 		ws = wb[META_SHEET_NAME]
-		for row in ws[2:ws.max_row]:
-			pass
 	else:
 		ws = wb.create_sheet(META_SHEET_NAME)
 		ws.append(["last_sync"])
@@ -144,67 +190,106 @@ def write_last_sync(path: Path, when: datetime) -> None:
 	# hide meta and lock workbook structure
 	ws.sheet_state = "veryHidden"
 	wb.security = WorkbookProtection(lockStructure=True)
-	wb.save(str(path))
 
 
-def _auto_size_columns(ws: Worksheet) -> None:
-	for col in ws.columns:
-		max_length = 0
-		col_letter = col[0].column_letter
-		for cell in col:
-			val = cell.value
-			length = len(str(val)) if val is not None else 0
-			if length > max_length:
-				max_length = length
-		ws.column_dimensions[col_letter].width = min(max(10, max_length + 2), 60)
-
-
-def _apply_date_formats(ws: Worksheet, date_headers: List[str]) -> None:
-	# Apply a simple date format to columns matching given headers
-	headers = {cell.value: idx for idx, cell in enumerate(ws[1], start=1)}
-	for h in date_headers:
-		idx = headers.get(h)
-		if not idx:
-			continue
-		for r in range(2, ws.max_row + 1):
-			cell = ws.cell(row=r, column=idx)
-			if isinstance(cell.value, str) and len(cell.value) in (10, 19):
-				# leave as text; Excel will still display it; robust parsing is environment-specific
-				cell.alignment = Alignment(horizontal="left")
+def read_last_sync(path: Path) -> Optional[datetime]:
+	if not path.exists():
+		return None
+	wb = load_workbook(filename=str(path))
+	return _meta_last_sync(wb)
 
 
-def _hide_columns(ws: Worksheet, headers_to_hide: List[str]) -> None:
-	headers = {cell.value: idx for idx, cell in enumerate(ws[1], start=1)}
-	for h in headers_to_hide:
-		idx = headers.get(h)
-		if idx:
-			ws.column_dimensions[ws.cell(row=1, column=idx).column_letter].hidden = True
+def write_last_sync(path: Path, when: datetime) -> None:
+	wb = ensure_workbook(path)
+	_set_meta_last_sync(wb, when)
+	wb.save(str(path))
 
 
-def _format_report_sheet(ws: Worksheet, columns: List[str]) -> None:
-	# Freeze header
+def _ensure_date_style(wb: Workbook) -> str:
+	"""Register the report's date style once per workbook (a single styles-table entry shared by
+	every date cell, instead of one Alignment per cell). Returns its name."""
+	if REPORT_DATE_STYLE not in wb.named_styles:
+		wb.add_named_style(NamedStyle(name=REPORT_DATE_STYLE, alignment=Alignment(horizontal="left")))
+	return REPORT_DATE_STYLE
+
+
+def _is_date_text(val: Any) -> bool:
+	# dates are kept as text (YYYY-MM-DD or with time); left aligned like real dates
+	return isinstance(val, str) and len(val) in (10, 19)
+
+
+class _ReportLayout:
+	"""Report sheet formatting gathered while rows are written: max text length per column (may start
+	from known lengths) and the date columns."""
+
+	def __init__(self, columns: Sequence[str], max_length: Optional[Sequence[int]] = None) -> None:
+		self.columns = list(columns)
+		self.max_length = [len(c) for c in self.columns]
+		if max_length is not None and len(max_length) == len(self.columns):
+			self.max_length = [max(a, int(b)) for a, b in zip(self.max_length, max_length)]
+		self.date_idx = [i for i, c in enumerate(self.columns) if c in REPORT_DATE_COLUMNS]
+
+	def observe(self, values: Sequence[Any]) -> None:
+		max_length = self.max_length
+		for i, val in enumerate(values):
+			if val is not None:
+				n = len(val) if isinstance(val, str) else len(str(val))
+				if n > max_length[i]:
+					max_length[i] = n
+
+	def row_cells(self, ws: Any, values: Sequence[Any], cell_type: Any) -> Sequence[Any]:
+		"""values as appended to ws: unchanged, or with date texts wrapped in styled cells."""
+		cells = None
+		for i in self.date_idx:
+			val = values[i]
+			if _is_date_text(val):
+				if cells is None:
+					cells = list(values)
+				cell = cell_type(ws, value=val)
+				cell.style = REPORT_DATE_STYLE
+				cells[i] = cell
+		return values if cells is None else cells
+
+	def apply_columns(self, ws: Any) -> None:
+		"""Widths from the running max lengths, hidden technical columns and the date column style."""
+		for idx, col in enumerate(self.columns):
+			dim = ws.column_dimensions[get_column_letter(idx + 1)]
+			dim.width = _column_width(self.max_length[idx])
+			if col in REPORT_HIDDEN_COLUMNS:
+				dim.hidden = True
+			if idx in self.date_idx:
+				# column default for cells typed in Excel later (dimensions take direct styles, not named ones)
+				dim.alignment = Alignment(horizontal="left")
+
+
+def _report_table(columns: List[str], row_count: int) -> Table:
+	ref = f"A1:{get_column_letter(len(columns))}{max(row_count, 1) + 1}"
+	table = Table(displayName=REPORT_TABLE_NAME, ref=ref)
+	table._initialise_columns()
+	for tc, col in zip(table.tableColumns, columns):
+		tc.name = col
+	table.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False, showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+	return table
+
+
+def _write_report_sheet(ws: Worksheet, columns: List[str], rows: Iterable[RowLike]) -> int:
+	"""Append header and rows to an empty regular sheet, formatting in the same pass. Returns the row count."""
+	_ensure_date_style(ws.parent)
+	layout = _ReportLayout(columns)
 	ws.freeze_panes = "A2"
-	# Create Excel table over the used range
-	end_col_letter = ws.cell(row=1, column=len(columns)).column_letter
-	end_row = ws.max_row
-	table = Table(displayName="ReportTable", ref=f"A1:{end_col_letter}{end_row}")
-	style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False, showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-	table.tableStyleInfo = style
-	ws.add_table(table)
-	# Auto-size columns and basic date formatting
-	_auto_size_columns(ws)
-	_apply_date_formats(ws, [
-		"ETD (fecha)",
-		"ETA (fecha)",
-		"Fecha de ISF",
-		"Fecha de customs clearance",
-		"Fecha de empty return",
-	])
-	# Hide technical columns
-	_hide_columns(ws, ["orderId", "__createdAt", "__lastUpdateAt"])
-
-
-def write_report_for_user(user_id: str, rows: List[Dict[str, Any]], columns: List[str], output_dir: Path) -> Path:
+	ws.append(columns)
+	count = 0
+	for r in rows:
+		values = row_values(r, columns)
+		layout.observe(values)
+		ws.append(layout.row_cells(ws, values, Cell))
+		count += 1
+	layout.apply_columns(ws)
+	ws.add_table(_report_table(columns, count))
+	return count
+
+
+def write_report_for_user(user_id: str, rows: List[RowLike], columns: List[str], output_dir: Path) -> Path:
 	"""Create or overwrite a 'report' sheet with the provided rows and column order. Remove other sheets.
 	Adds table styling, frozen header, basic date formatting, and auto-size columns."""
 	output_dir.mkdir(parents=True, exist_ok=True)
@@ -214,12 +299,9 @@ def write_report_for_user(user_id: str, rows: List[Dict[str, Any]], columns: Lis
 	if REPORT_SHEET_NAME in wb.sheetnames:
 		ws_old = wb[REPORT_SHEET_NAME]
 		wb.remove(ws_old)
-	# Create report sheet and write rows
+	# Create report sheet and write rows (formatted as they are appended)
 	ws = wb.create_sheet(REPORT_SHEET_NAME)
-	ws.append(columns)
-	for r in rows:
-		ws.append([r.get(c) for c in columns])
-	_format_report_sheet(ws, columns)
+	_write_report_sheet(ws, columns, rows)
 	# Remove any other sheet to keep only 'report'
 	for name in list(wb.sheetnames):
 		if name != REPORT_SHEET_NAME and name != META_SHEET_NAME:
@@ -228,87 +310,406 @@ def write_report_for_user(user_id: str, rows: List[Dict[str, Any]], columns: Lis
 	return wb_path
 
 
-def read_report_rows(path: Path, columns: List[str]) -> List[Dict[str, Any]]:
-	"""Read current report rows into a list of dicts (without headers)."""
-	if not path.exists():
-		return []
-	wb = load_workbook(filename=str(path))
-	if REPORT_SHEET_NAME not in wb.sheetnames:
+def _column_width(max_length: int) -> int:
+	return min(max(10, max_length + 2), 60)
+
+
+def write_report_streaming(user_id: str, rows: Iterable[Sequence[Any]], columns: List[str], output_dir: Path, last_sync: datetime) -> Tuple[Path, int]:
+	"""Write the 'report' and 'meta' sheets in a single streamed pass and save. Returns (wb_path, row_count)."""
+	output_dir.mkdir(parents=True, exist_ok=True)
+	wb_path = output_dir / f"{user_id}.xlsx"
+	count = _save_report_streaming(str(wb_path), rows, columns, last_sync)
+	return wb_path, count
+
+
+def _save_report_streaming(target: Any, rows: Iterable[Sequence[Any]], columns: List[str], last_sync: datetime, column_lengths: Optional[Sequence[int]] = None) -> int:
+	"""write_report_streaming into target (a filename or a writable binary file object). Columns are
+	sized from column_lengths (max text length per column over all rows) when given, otherwise from
+	the first WIDTH_SAMPLE_ROWS rows."""
+	wb = Workbook(write_only=True)
+	wb.security = WorkbookProtection(lockStructure=True)
+	ws = wb.create_sheet(REPORT_SHEET_NAME)
+	ws.freeze_panes = "A2"
+
+	_ensure_date_style(wb)
+	layout = _ReportLayout(columns, column_lengths)
+
+	rows_iter = iter(rows)
+	# Column widths and hidden flags must be set before the first row is written: size from a bounded sample
+	sample = [] if column_lengths is not None else list(islice(rows_iter, WIDTH_SAMPLE_ROWS))
+	for r in sample:
+		layout.observe(r)
+	layout.apply_columns(ws)
+
+	ws.append(columns)
+	count = 0
+	for r in chain(sample, rows_iter):
+		ws.append(layout.row_cells(ws, r, WriteOnlyCell))
+		count += 1
+
+	with warnings.catch_warnings():
+		# openpyxl always warns for write-only tables; columns are set explicitly in _report_table
+		warnings.simplefilter("ignore", UserWarning)
+		ws.add_table(_report_table(columns, count))
+
+	meta = wb.create_sheet(META_SHEET_NAME)
+	meta.sheet_state = "veryHidden"
+	meta.append(["last_sync"])
+	meta.append([last_sync.isoformat()])
+	wb.save(target)
+	return count
+
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _column_index(ref: str) -> int:
+	"""0-based column index from a cell reference like 'AB12'."""
+	idx = 0
+	for ch in ref:
+		if "A" <= ch <= "Z":
+			idx = idx * 26 + (ord(ch) - 64)
+		else:
+			break
+	return idx - 1
+
+
+def _sheet_part(zf: zipfile.ZipFile, sheet_name: str) -> Optional[str]:
+	"""Resolve the zip member holding sheet_name via workbook.xml and its relationships."""
+	wb_root = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+	rel_id = None
+	for sheet in wb_root.iter(f"{_SHEET_NS}sheet"):
+		if sheet.get("name") == sheet_name:
+			rel_id = sheet.get(f"{_REL_NS}id")
+			break
+	if rel_id is None:
+		return None
+	rels_root = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+	for rel in rels_root.iter(f"{_PKG_REL_NS}Relationship"):
+		if rel.get("Id") == rel_id:
+			target = rel.get("Target", "")
+			return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+	return None
+
+
+def _string_item_text(item: Optional[ElementTree.Element]) -> str:
+	"""Text of a shared (<si>) or inline (<is>) string: its <t>, or its rich-text runs' <t>, in order.
+	Phonetic runs (<rPh>) are annotations, not part of the value."""
+	if item is None:
+		return ""
+	parts: List[str] = []
+	for child in item:
+		if child.tag == f"{_SHEET_NS}t":
+			parts.append(child.text or "")
+		elif child.tag == f"{_SHEET_NS}r":
+			t = child.find(f"{_SHEET_NS}t")
+			if t is not None:
+				parts.append(t.text or "")
+	return "".join(parts)
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+	try:
+		data = zf.read("xl/sharedStrings.xml")
+	except KeyError:
 		return []
-	ws = wb[REPORT_SHEET_NAME]
-	rows: List[Dict[str, Any]] = []
-	for r in range(2, ws.max_row + 1):
-		row: Dict[str, Any] = {}
-		for c_idx, col_name in enumerate(columns, start=1):
-			row[col_name] = ws.cell(row=r, column=c_idx).value
-		rows.append(row)
-	return rows
+	root = ElementTree.fromstring(data)
+	return [_string_item_text(si) for si in root.iter(f"{_SHEET_NS}si")]
 
 
-def write_report_rows(path: Path, columns: List[str], rows: List[Dict[str, Any]]) -> Path:
-	"""Overwrite report sheet with given rows and reapply formatting."""
-	wb = ensure_workbook(path)
+def _date_styles(zf: zipfile.ZipFile) -> Tuple[Dict[str, bool], datetime]:
+	"""Cell style ids (the `s` attribute) whose number format is a date/time, mapped to whether it is
+	a duration, and the workbook's date epoch: what openpyxl uses to turn serials into datetimes."""
+	wb_pr = ElementTree.fromstring(zf.read("xl/workbook.xml")).find(f"{_SHEET_NS}workbookPr")
+	epoch = MAC_EPOCH if wb_pr is not None and wb_pr.get("date1904") in ("1", "true") else WINDOWS_EPOCH
+	try:
+		data = zf.read("xl/styles.xml")
+	except KeyError:
+		return {}, epoch
+	styles = Stylesheet.from_tree(ElementTree.fromstring(data))
+	return {str(i): i in styles.timedelta_formats for i in styles.date_formats}, epoch
+
+
+def _cell_value(cell: ElementTree.Element, shared: List[str], date_styles: Optional[Dict[str, bool]] = None, epoch: datetime = WINDOWS_EPOCH) -> Any:
+	kind = cell.get("t")
+	if kind == "inlineStr":
+		return _string_item_text(cell.find(f"{_SHEET_NS}is"))
+	v = cell.find(f"{_SHEET_NS}v")
+	if v is None or v.text is None:
+		return None
+	text = v.text
+	if kind == "s":
+		return shared[int(text)]
+	if kind in ("str", "e"):
+		return text
+	if kind == "b":
+		return text == "1"
+	if kind == "d":
+		try:
+			return datetime.fromisoformat(text)
+		except ValueError:
+			return text
+	value: Any = float(text) if "." in text or "E" in text or "e" in text else int(text)
+	style = cell.get("s")
+	if date_styles and style in date_styles:
+		try:
+			return from_excel(value, epoch, timedelta=date_styles[style])
+		except (OverflowError, ValueError):
+			return value
+	return value
+
+
+def _iter_sheet_values(path: WorkbookSource, sheet_name: str) -> Iterator[Tuple[Any, ...]]:
+	"""Stream row value tuples straight from the sheet XML, as openpyxl's values_only rows.
+	Raises LookupError if the sheet does not exist."""
+	row_tag = f"{_SHEET_NS}row"
+	cell_tag = f"{_SHEET_NS}c"
+	with zipfile.ZipFile(_source_arg(path)) as zf:
+		part = _sheet_part(zf, sheet_name)
+		if part is None:
+			raise LookupError(sheet_name)
+		shared = _shared_strings(zf)
+		date_styles, epoch = _date_styles(zf)
+		with zf.open(part) as fh:
+			for _, el in ElementTree.iterparse(fh, events=("end",)):
+				if el.tag != row_tag:
+					continue
+				values: List[Any] = []
+				for cell in el.iter(cell_tag):
+					ref = cell.get("r")
+					if ref:
+						idx = _column_index(ref)
+						if idx > len(values):
+							values.extend([None] * (idx - len(values)))
+					values.append(_cell_value(cell, shared, date_styles, epoch))
+				el.clear()
+				yield tuple(values)
+
+
+def _iter_sheet_values_openpyxl(path: WorkbookSource, sheet_name: str) -> Iterator[Tuple[Any, ...]]:
+	wb = load_workbook(filename=_source_arg(path), read_only=True)
+	try:
+		if sheet_name not in wb.sheetnames:
+			raise LookupError(sheet_name)
+		yield from wb[sheet_name].iter_rows(values_only=True)
+	finally:
+		wb.close()
+
+
+def iter_report_columns(path: WorkbookSource, names: List[str]) -> Iterator[Tuple[Any, ...]]:
+	"""Lazily yield one tuple per report row with only the requested columns, matched by header
+	name (missing headers yield None). Parses the sheet XML directly and falls back to openpyxl's
+	read-only, values-only reader for packages it cannot resolve. path may also be a file object."""
+	if not _source_exists(path):
+		return
+	try:
+		rows = _iter_sheet_values(path, REPORT_SHEET_NAME)
+		header = next(rows, None)
+	except LookupError:
+		return
+	except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+		rows = _iter_sheet_values_openpyxl(path, REPORT_SHEET_NAME)
+		try:
+			header = next(rows, None)
+		except LookupError:
+			return
+	if header is None:
+		return
+	index = {str(v): i for i, v in enumerate(header) if v is not None}
+	positions = [index.get(n) for n in names]
+	for values in rows:
+		if all(v is None for v in values):
+			continue
+		width = len(values)
+		yield tuple(values[i] if i is not None and i < width else None for i in positions)
+
+
+def read_report_rows(path: Path, columns: List[str]) -> List[ReportRow]:
+	"""Read current report rows (without headers) as compact ReportRows, mapping columns by header name."""
+	row_type = row_type_for(columns)
+	return [row_type(values) for values in iter_report_columns(path, columns)]
+
+
+def _replace_report_sheet(wb: Workbook, columns: List[str], rows: Iterable[RowLike]) -> None:
 	if REPORT_SHEET_NAME in wb.sheetnames:
 		wb.remove(wb[REPORT_SHEET_NAME])
 	ws = wb.create_sheet(REPORT_SHEET_NAME)
-	ws.append(columns)
-	for r in rows:
-		ws.append([r.get(c) for c in columns])
-	_format_report_sheet(ws, columns)
+	_write_report_sheet(ws, columns, rows)
 	# Remove any other non-meta sheet
 	for name in list(wb.sheetnames):
 		if name != REPORT_SHEET_NAME and name != META_SHEET_NAME:
 			wb.remove(wb[name])
-	wb.save(str(path))
-	return path
 
 
-def upsert_report_for_user(user_id: str, changed_rows: List[Dict[str, Any]], columns: List[str], output_dir: Path) -> Path:
-	"""Merge changed rows into existing report by orderId and write back, preserving order by __createdAt asc."""
-	output_dir.mkdir(parents=True, exist_ok=True)
-	wb_path = output_dir / f"{user_id}.xlsx"
-	existing = read_report_rows(wb_path, columns)
-	by_id: Dict[str, Dict[str, Any]] = {}
+def _merge_report_rows(existing: Iterable[RowLike], changed_rows: List[RowLike]) -> Tuple[List[RowLike], List[str], List[str]]:
+	"""Merge changed rows into existing ones by orderId, sorted by __createdAt asc. Returns (merged, created_ids, updated_ids)."""
+	by_id: Dict[str, RowLike] = {}
 	for r in existing:
 		key = str(r.get("orderId")) if r.get("orderId") is not None else None
 		if key:
 			by_id[key] = r
-	# Apply changes
+	existing_ids = set(by_id)
+	created_ids: List[str] = []
+	updated_ids: List[str] = []
 	for r in changed_rows:
 		key = str(r.get("orderId")) if r.get("orderId") is not None else None
 		if not key:
 			continue
+		if key in existing_ids:
+			updated_ids.append(key)
+		else:
+			created_ids.append(key)
 		by_id[key] = r
-	# Build merged and sort by __createdAt asc (missing last)
 	merged = list(by_id.values())
 	merged.sort(key=lambda x: (x.get("__createdAt") or ""))
-	return write_report_rows(wb_path, columns, merged)
+	return merged, created_ids, updated_ids
 
 
-def upsert_report_for_user_with_stats(user_id: str, changed_rows: List[Dict[str, Any]], columns: List[str], output_dir: Path) -> Tuple[Path, List[str], List[str]]:
-	"""Like upsert_report_for_user, but returns (wb_path, created_ids, updated_ids)."""
+def write_report_rows(path: Path, columns: List[str], rows: List[RowLike]) -> Path:
+	"""Overwrite report sheet with given rows and reapply formatting."""
+	wb = ensure_workbook(path)
+	_replace_report_sheet(wb, columns, rows)
+	wb.save(str(path))
+	return path
+
+
+def upsert_report_for_user(user_id: str, changed_rows: List[RowLike], columns: List[str], output_dir: Path) -> Path:
+	"""Merge changed rows into existing report by orderId and write back, preserving order by __createdAt asc."""
 	output_dir.mkdir(parents=True, exist_ok=True)
 	wb_path = output_dir / f"{user_id}.xlsx"
 	existing = read_report_rows(wb_path, columns)
-	existing_ids = set()
 	by_id: Dict[str, Dict[str, Any]] = {}
 	for r in existing:
 		key = str(r.get("orderId")) if r.get("orderId") is not None else None
 		if key:
-			existing_ids.add(key)
 			by_id[key] = r
-	created_ids: List[str] = []
-	updated_ids: List[str] = []
+	# Apply changes
 	for r in changed_rows:
 		key = str(r.get("orderId")) if r.get("orderId") is not None else None
 		if not key:
 			continue
-		if key in existing_ids:
-			updated_ids.append(key)
-		else:
-			created_ids.append(key)
 		by_id[key] = r
+	# Build merged and sort by __createdAt asc (missing last)
 	merged = list(by_id.values())
 	merged.sort(key=lambda x: (x.get("__createdAt") or ""))
+	return write_report_rows(wb_path, columns, merged)
+
+
+def upsert_report_for_user_with_stats(user_id: str, changed_rows: List[RowLike], columns: List[str], output_dir: Path) -> Tuple[Path, List[str], List[str]]:
+	"""Like upsert_report_for_user, but returns (wb_path, created_ids, updated_ids)."""
+	output_dir.mkdir(parents=True, exist_ok=True)
+	wb_path = output_dir / f"{user_id}.xlsx"
+	existing = read_report_rows(wb_path, columns)
+	merged, created_ids, updated_ids = _merge_report_rows(existing, changed_rows)
 	path = write_report_rows(wb_path, columns, merged)
 	return path, created_ids, updated_ids
+
+
+def _package_sheet_names(path: WorkbookSource) -> List[str]:
+	"""Sheet names from workbook.xml, without parsing any worksheet."""
+	try:
+		with zipfile.ZipFile(_source_arg(path)) as zf:
+			root = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+	except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+		return []
+	return [str(sheet.get("name")) for sheet in root.iter(f"{_SHEET_NS}sheet")]
+
+
+class _SpooledBuffer(tempfile.SpooledTemporaryFile):  # type: ignore[type-arg]
+	"""SpooledTemporaryFile usable by zipfile (openpyxl, the XML reader): before Python 3.11 it lacks
+	the io capability checks zipfile calls, e.g. seekable()."""
+
+	def readable(self) -> bool:
+		return True
+
+	def seekable(self) -> bool:
+		return True
+
+	def writable(self) -> bool:
+		return True
+
+
+class ReportWorkbook:
+	"""One account's workbook for one run, named `name` in Drive. With memory_limit its bytes live in a
+	buffer (spilling to a temp file past memory_limit) and `path` is never touched."""
+
+	def __init__(self, path: Path, memory_limit: Optional[int] = None, name: Optional[str] = None) -> None:
+		self.path = path
+		self.name = name if name is not None else path.name
+		self.buffer: Optional[BinaryIO] = None
+		if memory_limit:
+			self.buffer = _SpooledBuffer(max_size=memory_limit)  # type: ignore[assignment]
+
+	@property
+	def source(self) -> WorkbookSource:
+		"""Where the workbook bytes are: the in-memory buffer, or path."""
+		return self.buffer if self.buffer is not None else self.path
+
+	@property
+	def size(self) -> int:
+		return workbook_size(self.source) if _source_exists(self.source) else 0
+
+	@contextmanager
+	def open_writer(self) -> Iterator[BinaryIO]:
+		"""An emptied binary file object to write the whole package into (e.g. a download)."""
+		if self.buffer is None:
+			with open(self.path, "wb") as fh:
+				yield fh
+			return
+		self.buffer.seek(0)
+		self.buffer.truncate()
+		yield self.buffer
+
+	def detach(self) -> WorkbookSource:
+		"""Hand the saved workbook over (e.g. to a background upload): returns the buffer, which the
+		caller must close, or the path. This object no longer owns it."""
+		source = self.source
+		self.buffer = None
+		return source
+
+	def close(self) -> None:
+		if self.buffer is not None:
+			self.buffer.close()
+			self.buffer = None
+
+	def __enter__(self) -> "ReportWorkbook":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self.close()
+
+	@property
+	def sheetnames(self) -> List[str]:
+		return _package_sheet_names(self.source) if _source_exists(self.source) else []
+
+	@property
+	def has_report(self) -> bool:
+		return REPORT_SHEET_NAME in self.sheetnames
+
+	def last_sync(self) -> Optional[datetime]:
+		if not _source_exists(self.source):
+			return None
+		try:
+			rows = _iter_sheet_values(self.source, META_SHEET_NAME)
+			next(rows, None)
+			values = next(rows, None)
+		except LookupError:
+			return None
+		except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+			return _meta_last_sync(ensure_workbook(self.source))
+		val = values[0] if values else None
+		try:
+			return datetime.fromisoformat(val) if val else None
+		except Exception:
+			return None
+
+	def rebuild(self, rows: Iterable[Sequence[Any]], columns: List[str], last_sync: datetime, column_lengths: Optional[Sequence[int]] = None) -> int:
+		"""Replace the whole file with streamed row tuples plus meta (one save), sized from
+		column_lengths when given. Returns the row count."""
+		if self.buffer is None:
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			return _save_report_streaming(str(self.path), rows, columns, last_sync, column_lengths)
+		with self.open_writer() as fh:
+			return _save_report_streaming(fh, rows, columns, last_sync, column_lengths)
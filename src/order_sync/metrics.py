@@ -0,0 +1,184 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+try:
+	import resource
+except ImportError:  # not available on Windows
+	resource = None  # type: ignore[assignment]
+
+from .utils import atomic_write
+
+
+METRICS_JSON_FILE = "order_sync_metrics.json"
+METRICS_PROM_FILE = "order_sync.prom"
+
+T = TypeVar("T")
+
+
+def peak_rss_bytes() -> Optional[int]:
+	"""Peak resident set size of the process so far (None where getrusage is unavailable). A
+	process-wide high-water mark, so it is only meaningful per run, not per account."""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes on Linux, bytes on macOS
+	return peak if sys.platform == "darwin" else peak * 1024
+
+
+class AccountMetrics:
+	"""Stage timings (exclusive of nested stages) and counters for one account sync. Not thread-safe."""
+
+	def __init__(self, account_id: str) -> None:
+		self.account_id = account_id
+		self.seconds: Dict[str, float] = {}
+		self.counts: Dict[str, int] = {}
+		self.bytes: Dict[str, int] = {}
+		self.mode: Optional[str] = None
+		self.error: Optional[str] = None
+		self.total_seconds = 0.0
+		self._stack: List[List[Any]] = []
+
+	def _enter(self, stage: str) -> None:
+		self._stack.append([stage, time.perf_counter(), 0.0])
+
+	def _exit(self) -> None:
+		stage, started, nested = self._stack.pop()
+		elapsed = time.perf_counter() - started
+		self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - nested
+		if self._stack:
+			self._stack[-1][2] += elapsed
+
+	@contextmanager
+	def stage(self, stage: str) -> Iterator[None]:
+		self._enter(stage)
+		try:
+			yield
+		finally:
+			self._exit()
+
+	def timed_iter(self, stage: str, items: Iterable[T], count: Optional[str] = None) -> Iterator[T]:
+		"""Yield from items, charging the time spent producing each item to `stage` and counting
+		the items under `count` when given."""
+		it = iter(items)
+		n = 0
+		try:
+			while True:
+				self._enter(stage)
+				try:
+					item = next(it)
+				except StopIteration:
+					return
+				finally:
+					self._exit()
+				n += 1
+				yield item
+		finally:
+			if count:
+				self.add_count(count, n)
+
+	def add_count(self, name: str, n: int) -> None:
+		self.counts[name] = self.counts.get(name, 0) + int(n)
+
+	def add_bytes(self, name: str, n: int) -> None:
+		self.bytes[name] = self.bytes.get(name, 0) + int(n)
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {
+			"account_id": self.account_id,
+			"mode": self.mode,
+			"ok": self.error is None,
+			"error": self.error,
+			"total_seconds": round(self.total_seconds, 4),
+			"stage_seconds": {k: round(v, 4) for k, v in self.seconds.items()},
+			"counts": dict(self.counts),
+			"bytes": dict(self.bytes),
+		}
+
+
+class RunMetrics:
+	"""Metrics of a whole run: one AccountMetrics per account, exported at the end as a JSON
+	summary and a Prometheus textfile-collector file (both written atomically)."""
+
+	def __init__(self, started_at: datetime) -> None:
+		self.started_at = started_at
+		self._started = time.perf_counter()
+		self._lock = threading.Lock()
+		self.accounts: List[AccountMetrics] = []
+
+	def account(self, account_id: str) -> AccountMetrics:
+		m = AccountMetrics(account_id)
+		with self._lock:
+			self.accounts.append(m)
+		return m
+
+	def to_dict(self) -> Dict[str, Any]:
+		with self._lock:
+			accounts = list(self.accounts)
+		return {
+			"started_at": self.started_at.isoformat(),
+			"seconds": round(time.perf_counter() - self._started, 4),
+			"peak_rss_bytes": peak_rss_bytes(),
+			"accounts_ok": sum(1 for a in accounts if a.error is None),
+			"accounts_failed": sum(1 for a in accounts if a.error is not None),
+			"accounts": [a.to_dict() for a in accounts],
+		}
+
+	def export(self, output_dir: Path) -> Dict[str, Any]:
+		summary = self.to_dict()
+		with atomic_write(output_dir / METRICS_JSON_FILE) as f:
+			f.write(json.dumps(summary, indent=2) + "\n")
+		with atomic_write(output_dir / METRICS_PROM_FILE) as f:
+			f.write(format_prometheus(summary))
+		return summary
+
+
+def _label(value: Any) -> str:
+	return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_prometheus(summary: Dict[str, Any]) -> str:
+	"""Render a run summary (RunMetrics.to_dict) in the Prometheus text exposition format."""
+	lines: List[str] = []
+
+	def metric(name: str, help_text: str, samples: List[Any]) -> None:
+		lines.append(f"# HELP {name} {help_text}")
+		lines.append(f"# TYPE {name} gauge")
+		for labels, value in samples:
+			if value is None:
+				continue
+			if labels:
+				rendered = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+				lines.append(f"{name}{{{rendered}}} {value}")
+			else:
+				lines.append(f"{name} {value}")
+
+	accounts = summary["accounts"]
+	started = datetime.fromisoformat(summary["started_at"])
+	if started.tzinfo is None:
+		# run timestamps are naive UTC
+		started = started.replace(tzinfo=timezone.utc)
+	metric("order_sync_last_run_timestamp_seconds", "Start time of the last run.", [({}, started.timestamp())])
+	metric("order_sync_run_seconds", "Wall time of the last run.", [({}, summary["seconds"])])
+	metric("order_sync_run_peak_rss_bytes", "Peak resident memory of the last run.", [({}, summary["peak_rss_bytes"])])
+	metric("order_sync_account_success", "1 if the account synced without error in the last run.", [
+		({"account": a["account_id"]}, 1 if a["ok"] else 0) for a in accounts
+	])
+	metric("order_sync_account_seconds", "Wall time of the account sync.", [
+		({"account": a["account_id"], "mode": a["mode"] or "none"}, a["total_seconds"]) for a in accounts
+	])
+	metric("order_sync_stage_seconds", "Exclusive time per sync stage.", [
+		({"account": a["account_id"], "stage": s}, v) for a in accounts for s, v in a["stage_seconds"].items()
+	])
+	metric("order_sync_items", "Documents/rows handled per kind.", [
+		({"account": a["account_id"], "kind": k}, v) for a in accounts for k, v in a["counts"].items()
+	])
+	metric("order_sync_bytes", "Bytes transferred or written per kind.", [
+		({"account": a["account_id"], "kind": k}, v) for a in accounts for k, v in a["bytes"].items()
+	])
+	return "\n".join(lines) + "\n"
@@ -1,6 +1,13 @@
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from pymongo import MongoClient
-from bson import ObjectId
+from pymongo.change_stream import ChangeStream
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+from bson import ObjectId, json_util
 from datetime import datetime
 
 
@@ -10,77 +17,274 @@ ORDER_LOG_COLLECTION = "OrderLog"
 ACCOUNTS_DB = "MGP-ACCOUNT"
 ACCOUNTS_COLLECTION = "Accounts"
 
+# Order fields needed by the report mapping
+ORDER_PROJECTION = {
+	"number": 1,
+	"bookingNumber": 1,
+	"dateETD": 1,
+	"isMANE": 1,
+	"dateETA": 1,
+	"isMANI": 1,
+	"origin": 1,
+	"stopovers": 1,
+	"destination": 1,
+	"internalClientNumber": 1,
+	"isISF": 1,
+	"dateISF": 1,
+	"createdAt": 1,
+	"dateLastUpdate": 1,
+}
 
-def get_mongo_client(uri: str) -> MongoClient:
-	return MongoClient(uri, retryWrites=True)
-
-
-def fetch_orders_by_account(uri: str, account_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-	client = get_mongo_client(uri)
-	db = client[ORDERS_DB]
-	col = db[ORDERS_COLLECTION]
-	query = {"accountId": ObjectId(account_id)}
-	projection = {
-		"number": 1,
-		"bookingNumber": 1,
-		"dateETD": 1,
-		"isMANE": 1,
-		"dateETA": 1,
-		"isMANI": 1,
-		"origin": 1,
-		"stopovers": 1,
-		"destination": 1,
-		"internalClientNumber": 1,
-		"isISF": 1,
-		"dateISF": 1,
-		"createdAt": 1,
-		"dateLastUpdate": 1,
-	}
-	cursor = col.find(query, projection).sort("createdAt", 1)
+
+# Full rebuilds page through an account's orders in this order; (createdAt, _id) is unique, so a
+# page (or a later run) can resume right after the last key it saw
+ORDER_KEYSET_SORT = [("createdAt", 1), ("_id", 1)]
+KEYSET_PAGE_SIZE = 5000
+# Partitioned fetch: upper bound on the number of createdAt ranges ($bucketAuto buckets)
+MAX_FETCH_RANGES = 1000
+
+
+def ref_prefix_filter(ref_prefixes: Optional[List[str]]) -> Dict[str, Any]:
+	"""Order filter keeping only references (`number`) that start with one of the prefixes.
+	One anchored regex per prefix inside $in so each one can use an index prefix scan."""
+	if not ref_prefixes:
+		return {}
+	return {"number": {"$in": [re.compile("^" + re.escape(p)) for p in ref_prefixes]}}
+
+
+def get_mongo_client(
+	uri: str,
+	max_pool_size: int = 10,
+	connect_timeout_ms: int = 10000,
+	server_selection_timeout_ms: int = 15000,
+	socket_timeout_ms: Optional[int] = None,
+) -> MongoClient:
+	return MongoClient(
+		uri,
+		retryWrites=True,
+		maxPoolSize=max_pool_size,
+		connectTimeoutMS=connect_timeout_ms,
+		serverSelectionTimeoutMS=server_selection_timeout_ms,
+		socketTimeoutMS=socket_timeout_ms,
+	)
+
+
+class MongoSession:
+	"""Run-scoped Mongo access: a single pooled MongoClient shared by every fetch (close it at the end)."""
+
+	def __init__(
+		self,
+		uri: str,
+		max_pool_size: int = 10,
+		connect_timeout_ms: int = 10000,
+		server_selection_timeout_ms: int = 15000,
+		socket_timeout_ms: Optional[int] = None,
+	) -> None:
+		self.client = get_mongo_client(
+			uri,
+			max_pool_size=max_pool_size,
+			connect_timeout_ms=connect_timeout_ms,
+			server_selection_timeout_ms=server_selection_timeout_ms,
+			socket_timeout_ms=socket_timeout_ms,
+		)
+
+	@property
+	def orders(self) -> Collection:
+		return self.client[ORDERS_DB][ORDERS_COLLECTION]
+
+	@property
+	def order_logs(self) -> Collection:
+		return self.client[ORDERS_DB][ORDER_LOG_COLLECTION]
+
+	@property
+	def accounts(self) -> Collection:
+		return self.client[ACCOUNTS_DB][ACCOUNTS_COLLECTION]
+
+	def close(self) -> None:
+		self.client.close()
+
+	def __enter__(self) -> "MongoSession":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self.close()
+
+
+def iter_orders_by_account(session: MongoSession, account_id: str, limit: Optional[int] = None, batch_size: int = 1000, ref_prefixes: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+	"""Stream an account's orders sorted by createdAt asc, without materializing the cursor."""
+	col = session.orders
+	query = {"accountId": ObjectId(account_id), **ref_prefix_filter(ref_prefixes)}
+	cursor = col.find(query, ORDER_PROJECTION).sort("createdAt", 1).batch_size(batch_size)
 	if limit:
 		cursor = cursor.limit(int(limit))
-	return list(cursor)
+	try:
+		yield from cursor
+	finally:
+		cursor.close()
+
+
+def order_key(doc: Dict[str, Any]) -> str:
+	"""Position of an order in ORDER_KEYSET_SORT order, as an opaque string (for checkpoints)."""
+	return json_util.dumps([doc.get("createdAt"), doc["_id"]])
+
+
+def _after_key_filter(key: str) -> Dict[str, Any]:
+	created_at, oid = json_util.loads(key)
+	if created_at is None:
+		# orders without createdAt sort first
+		return {"$or": [{"createdAt": None, "_id": {"$gt": oid}}, {"createdAt": {"$ne": None}}]}
+	return {"$or": [{"createdAt": {"$gt": created_at}}, {"createdAt": created_at, "_id": {"$gt": oid}}]}
+
+
+def iter_orders_keyset(session: MongoSession, account_id: str, after_key: Optional[str] = None, limit: Optional[int] = None, page_size: int = KEYSET_PAGE_SIZE, ref_prefixes: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+	"""Stream an account's orders in (createdAt, _id) order, one short query per page of page_size
+	(no long-lived cursor to time out), starting after after_key (see order_key) and stopping after
+	limit orders."""
+	col = session.orders
+	base = {"accountId": ObjectId(account_id), **ref_prefix_filter(ref_prefixes)}
+	remaining = int(limit) if limit else None
+	while remaining is None or remaining > 0:
+		n = page_size if remaining is None else min(page_size, remaining)
+		query = {**base, **_after_key_filter(after_key)} if after_key else base
+		cursor = col.find(query, ORDER_PROJECTION).sort(ORDER_KEYSET_SORT).limit(n).batch_size(n)
+		count = 0
+		last = None
+		try:
+			for doc in cursor:
+				count += 1
+				last = doc
+				yield doc
+		finally:
+			cursor.close()
+		if last is not None:
+			after_key = order_key(last)
+		if remaining is not None:
+			remaining -= count
+		if count < n:
+			return
 
 
-def fetch_orders_by_ids(uri: str, order_ids: List[str]) -> List[Dict[str, Any]]:
-	client = get_mongo_client(uri)
-	db = client[ORDERS_DB]
-	col = db[ORDERS_COLLECTION]
+def order_range_bounds(session: MongoSession, query: Dict[str, Any], ranges: int, limit: Optional[int] = None) -> Tuple[List[Any], Any]:
+	"""createdAt bounds splitting the orders matching query (the first `limit`, when given) into about
+	`ranges` ranges ($bucketAuto), plus the largest createdAt among them."""
+	if ranges <= 1:
+		return [], None
+	pipeline: List[Dict[str, Any]] = [{"$match": query}]
+	if limit:
+		pipeline += [{"$sort": dict(ORDER_KEYSET_SORT)}, {"$limit": int(limit)}]
+	pipeline.append({"$bucketAuto": {"groupBy": "$createdAt", "buckets": int(ranges)}})
+	bounds: List[Any] = []
+	last = None
+	for i, bucket in enumerate(session.orders.aggregate(pipeline, allowDiskUse=True)):
+		low = bucket["_id"]["min"]
+		# every bucket after the first starts at its min (the previous one's exclusive max)
+		if i > 0 and low is not None:
+			bounds.append(low)
+		# the last bucket's max is inclusive: the largest value
+		last = bucket["_id"]["max"]
+	return bounds, last
+
+
+def _range_filters(bounds: List[Any], upper: Any = None) -> List[Dict[str, Any]]:
+	"""Disjoint createdAt range filters, in order, covering everything (null/missing createdAt first),
+	or only up to createdAt <= upper when given."""
+	if not bounds:
+		return [{}]
+	filters: List[Dict[str, Any]] = [{"$or": [{"createdAt": {"$lt": bounds[0]}}, {"createdAt": None}]}]
+	for low, high in zip(bounds, bounds[1:]):
+		filters.append({"createdAt": {"$gte": low, "$lt": high}})
+	if upper is None:
+		filters.append({"createdAt": {"$gte": bounds[-1]}})
+	else:
+		filters.append({"createdAt": {"$gte": bounds[-1], "$lte": upper}})
+	return filters
+
+
+def iter_orders_partitioned(session: MongoSession, account_id: str, after_key: Optional[str] = None, limit: Optional[int] = None, workers: int = 4, range_size: int = KEYSET_PAGE_SIZE, ref_prefixes: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+	"""Same orders and order as iter_orders_keyset, read as createdAt ranges of about range_size by
+	`workers` threads, at most `workers` ranges ahead of the consumer."""
+	remaining = int(limit) if limit else None
+	if workers <= 1 or (remaining is not None and remaining <= range_size):
+		yield from iter_orders_keyset(session, account_id, after_key=after_key, limit=limit, page_size=range_size, ref_prefixes=ref_prefixes)
+		return
+	clauses = [{"accountId": ObjectId(account_id), **ref_prefix_filter(ref_prefixes)}]
+	if after_key:
+		clauses.append(_after_key_filter(after_key))
+	query = {"$and": clauses} if len(clauses) > 1 else clauses[0]
+	total = session.orders.count_documents(query, **({"limit": remaining} if remaining else {}))
+	ranges = min(MAX_FETCH_RANGES, -(-total // max(1, range_size)))
+	bounds, last = order_range_bounds(session, query, ranges, limit=remaining)
+	if not bounds:
+		yield from iter_orders_keyset(session, account_id, after_key=after_key, limit=limit, page_size=range_size, ref_prefixes=ref_prefixes)
+		return
+
+	def fetch_range(range_filter: Dict[str, Any], cap: Optional[int]) -> List[Dict[str, Any]]:
+		cursor = session.orders.find({"$and": clauses + [range_filter]}, ORDER_PROJECTION).sort(ORDER_KEYSET_SORT).batch_size(range_size)
+		if cap:
+			cursor = cursor.limit(cap)
+		try:
+			return list(cursor)
+		finally:
+			cursor.close()
+
+	filters = iter(_range_filters(bounds, last if remaining is not None else None))
+	with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="order-fetch") as pool:
+		pending: Deque["Future[List[Dict[str, Any]]]"] = deque(pool.submit(fetch_range, f, remaining) for f in islice(filters, workers))
+		try:
+			while pending and (remaining is None or remaining > 0):
+				docs = pending.popleft().result()
+				# later ranges need at most the orders still wanted after this one (none once it covers them)
+				after = None if remaining is None else remaining - len(docs)
+				nxt = next(filters, None) if after is None or after > 0 else None
+				if nxt is not None:
+					pending.append(pool.submit(fetch_range, nxt, after))
+				for doc in docs:
+					if remaining is not None:
+						if remaining <= 0:
+							return
+						remaining -= 1
+					yield doc
+		finally:
+			for future in pending:
+				future.cancel()
+
+
+def fetch_orders_by_account(session: MongoSession, account_id: str, limit: Optional[int] = None, ref_prefixes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+	return list(iter_orders_by_account(session, account_id, limit=limit, ref_prefixes=ref_prefixes))
+
+
+def fetch_orders_by_ids(session: MongoSession, order_ids: List[str], chunk_size: int = 1000, ref_prefixes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+	"""Fetch orders by id, splitting large id sets into several $in queries of chunk_size ids."""
+	col = session.orders
 	ids = [ObjectId(x) for x in order_ids]
-	projection = {
-		"number": 1,
-		"bookingNumber": 1,
-		"dateETD": 1,
-		"isMANE": 1,
-		"dateETA": 1,
-		"isMANI": 1,
-		"origin": 1,
-		"stopovers": 1,
-		"destination": 1,
-		"internalClientNumber": 1,
-		"isISF": 1,
-		"dateISF": 1,
-		"createdAt": 1,
-		"dateLastUpdate": 1,
-	}
-	return list(col.find({"_id": {"$in": ids}}, projection))
+	prefix_filter = ref_prefix_filter(ref_prefixes)
+	docs: List[Dict[str, Any]] = []
+	for start in range(0, len(ids), chunk_size):
+		docs.extend(col.find({"_id": {"$in": ids[start:start + chunk_size]}, **prefix_filter}, ORDER_PROJECTION))
+	return docs
 
 
-def fetch_account_name(uri: str, account_id: str) -> Optional[str]:
-	client = get_mongo_client(uri)
-	db = client[ACCOUNTS_DB]
-	col = db[ACCOUNTS_COLLECTION]
-	doc = col.find_one({"_id": ObjectId(account_id)}, {"accountName": 1})
-	if doc and doc.get("accountName"):
-		return str(doc.get("accountName"))
-	return None
+def fetch_account_name(session: MongoSession, account_id: str) -> Optional[str]:
+	return fetch_account_names(session, [account_id]).get(account_id)
 
 
-def fetch_updated_order_ids_since(uri: str, account_id: str, since: datetime, batch_size: int = 500) -> List[str]:
+def fetch_account_names(session: MongoSession, account_ids: List[str], chunk_size: int = 1000) -> Dict[str, Optional[str]]:
+	"""accountName of every existing account in account_ids (None if it has none), with one $in
+	query per chunk_size ids. Accounts that do not exist are left out."""
+	col = session.accounts
+	# a malformed id cannot exist: skip it instead of failing the whole batch
+	ids = [ObjectId(x) for x in dict.fromkeys(account_ids) if ObjectId.is_valid(x)]
+	names: Dict[str, Optional[str]] = {}
+	for start in range(0, len(ids), chunk_size):
+		for doc in col.find({"_id": {"$in": ids[start:start + chunk_size]}}, {"accountName": 1}):
+			name = doc.get("accountName")
+			names[str(doc["_id"])] = str(name) if name else None
+	return names
+
+
+def fetch_updated_order_ids_since(session: MongoSession, account_id: str, since: datetime, batch_size: int = 500) -> List[str]:
 	"""Return orderIds updated in OrderLog since 'since' (window by _id)."""
-	client = get_mongo_client(uri)
-	db = client[ORDERS_DB]
-	col = db[ORDER_LOG_COLLECTION]
+	col = session.order_logs
 	# use ObjectId time to window
 	min_oid = ObjectId.from_datetime(since)
 	q = {"accountId": ObjectId(account_id), "_id": {"$gt": min_oid}}
@@ -94,11 +298,55 @@ def fetch_updated_order_ids_since(uri: str, account_id: str, since: datetime, ba
 	return list(order_ids)
 
 
-def fetch_updated_logs_since(uri: str, account_id: str, since: datetime, batch_size: int = 500) -> List[Dict[str, Any]]:
+def iter_changed_orders_since(session: MongoSession, account_id: str, since: datetime, batch_size: int = 500, chunk_size: int = 1000, ref_prefixes: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+	"""Stream the current Order projection of every order with OrderLog entries since 'since', in one
+	aggregation ($lookup), or id scan plus $in chunks on MongoDB < 5.0."""
+	min_oid = ObjectId.from_datetime(since)
+	order_stages: List[Dict[str, Any]] = [{"$project": ORDER_PROJECTION}]
+	prefix_filter = ref_prefix_filter(ref_prefixes)
+	if prefix_filter:
+		order_stages.insert(0, {"$match": prefix_filter})
+	pipeline = [
+		{"$match": {"accountId": ObjectId(account_id), "_id": {"$gt": min_oid}}},
+		{"$group": {"_id": "$orderId"}},
+		{"$lookup": {
+			"from": ORDERS_COLLECTION,
+			"localField": "_id",
+			"foreignField": "_id",
+			"pipeline": order_stages,
+			"as": "order",
+		}},
+		{"$unwind": "$order"},
+		{"$replaceRoot": {"newRoot": "$order"}},
+	]
+	try:
+		cursor = session.order_logs.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+	except OperationFailure:
+		order_ids = fetch_updated_order_ids_since(session, account_id, since=since, batch_size=batch_size)
+		yield from fetch_orders_by_ids(session, order_ids, chunk_size=chunk_size, ref_prefixes=ref_prefixes)
+		return
+	try:
+		yield from cursor
+	finally:
+		cursor.close()
+
+
+def watch_order_logs(session: MongoSession, account_ids: List[str], resume_after: Optional[Dict[str, Any]] = None, max_await_time_ms: int = 1000) -> ChangeStream:
+	"""Open a change stream on OrderLog inserts for the given accounts (requires a replica set).
+	Only the resume token and the fields needed to route the event are returned."""
+	pipeline = [
+		{"$match": {
+			"operationType": "insert",
+			"fullDocument.accountId": {"$in": [ObjectId(x) for x in account_ids]},
+		}},
+		{"$project": {"fullDocument.accountId": 1, "fullDocument.orderId": 1}},
+	]
+	return session.order_logs.watch(pipeline, resume_after=resume_after, max_await_time_ms=max_await_time_ms)
+
+
+def fetch_updated_logs_since(session: MongoSession, account_id: str, since: datetime, batch_size: int = 500) -> List[Dict[str, Any]]:
 	"""Return detailed OrderLog entries (orderId, action, date, _id) since timestamp for auditing/verbose."""
-	client = get_mongo_client(uri)
-	db = client[ORDERS_DB]
-	col = db[ORDER_LOG_COLLECTION]
+	col = session.order_logs
 	min_oid = ObjectId.from_datetime(since)
 	q = {"accountId": ObjectId(account_id), "_id": {"$gt": min_oid}}
 	proj = {"orderId": 1, "action": 1, "date": 1, "_id": 1}
@@ -106,36 +354,62 @@ def fetch_updated_logs_since(uri: str, account_id: str, since: datetime, batch_s
 	return list(cursor)
 
 
-def fetch_recent_field_changes(uri: str, account_id: str, since: datetime, order_ids: List[str], limit_per_order: int = 3) -> List[Tuple[str, List[Dict[str, Any]]]]:
-	"""Return small list of recent fieldChanges per orderId since timestamp for audit logs."""
-	client = get_mongo_client(uri)
-	db = client[ORDERS_DB]
-	col = db[ORDER_LOG_COLLECTION]
+def _recent_changes_pipeline(match: Dict[str, Any], limit_per_order: int, changes_per_entry: int, top_n: bool) -> List[Dict[str, Any]]:
+	entry = {
+		"id": "$_id",
+		"action": "$action",
+		"date": "$date",
+		"changes": {"$map": {
+			"input": {"$slice": [{"$ifNull": ["$fieldChanges", []]}, changes_per_entry]},
+			"as": "c",
+			"in": {"fieldName": "$$c.fieldName", "fieldLabel": "$$c.fieldLabel", "oldValue": "$$c.oldValue", "newValue": "$$c.newValue"},
+		}},
+	}
+	if top_n:
+		# MongoDB >= 5.2: keep only the newest entries per order while grouping
+		group = {"_id": "$orderId", "first": {"$min": "$_id"}, "entries": {"$topN": {"n": limit_per_order, "sortBy": {"_id": -1}, "output": entry}}}
+		stages = [{"$match": match}, {"$group": group}]
+	else:
+		group = {"_id": "$orderId", "first": {"$min": "$_id"}, "entries": {"$push": entry}}
+		stages = [
+			{"$match": match},
+			{"$sort": {"_id": -1}},
+			{"$group": group},
+			{"$project": {"first": 1, "entries": {"$slice": ["$entries", limit_per_order]}}},
+		]
+	return stages + [{"$sort": {"first": 1}}]
+
+
+def fetch_recent_field_changes(session: MongoSession, account_id: str, since: datetime, order_ids: List[str], limit_per_order: int = 3, changes_per_entry: int = 5, chunk_size: int = 1000) -> List[Tuple[str, List[Dict[str, Any]]]]:
+	"""Return the last limit_per_order OrderLog entries (oldest first, at most changes_per_entry
+	fieldChanges each) per orderId since timestamp, for audit logs."""
+	col = session.order_logs
 	min_oid = ObjectId.from_datetime(since)
 	ids = [ObjectId(x) for x in order_ids]
-	q = {"accountId": ObjectId(account_id), "orderId": {"$in": ids}, "_id": {"$gt": min_oid}}
-	proj = {"orderId": 1, "action": 1, "date": 1, "fieldChanges": 1, "_id": 1}
-	cursor = col.find(q, proj).sort("_id", 1)
-	by_order: Dict[str, List[Dict[str, Any]]] = {}
-	for doc in cursor:
-		key = str(doc.get("orderId")) if doc.get("orderId") is not None else None
-		if not key:
-			continue
-		entry = {
-			"action": doc.get("action"),
-			"date": doc.get("date"),
-			"changes": []
-		}
-		changes = doc.get("fieldChanges") or []
-		for ch in changes[:5]:
-			entry["changes"].append({
-				"field": ch.get("fieldName") or ch.get("fieldLabel"),
-				"old": ch.get("oldValue"),
-				"new": ch.get("newValue"),
-			})
-		by_order.setdefault(key, []).append(entry)
-	# Truncate per order
 	out: List[Tuple[str, List[Dict[str, Any]]]] = []
-	for oid, entries in by_order.items():
-		out.append((oid, entries[-limit_per_order:]))
+	top_n = True
+	for start in range(0, len(ids), chunk_size):
+		match = {"accountId": ObjectId(account_id), "orderId": {"$in": ids[start:start + chunk_size]}, "_id": {"$gt": min_oid}}
+		try:
+			docs = list(col.aggregate(_recent_changes_pipeline(match, limit_per_order, changes_per_entry, top_n), allowDiskUse=True))
+		except OperationFailure:
+			if not top_n:
+				raise
+			# $topN needs MongoDB 5.2: sort + $push + $slice instead
+			top_n = False
+			docs = list(col.aggregate(_recent_changes_pipeline(match, limit_per_order, changes_per_entry, top_n), allowDiskUse=True))
+		for doc in docs:
+			if doc.get("_id") is None:
+				continue
+			entries = []
+			for e in reversed(doc.get("entries") or []):
+				entries.append({
+					"action": e.get("action"),
+					"date": e.get("date"),
+					"changes": [
+						{"field": ch.get("fieldName") or ch.get("fieldLabel"), "old": ch.get("oldValue"), "new": ch.get("newValue")}
+						for ch in e.get("changes") or []
+					],
+				})
+			out.append((str(doc["_id"]), entries))
 	return out
@@ -1,27 +1,57 @@
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
 
 from .utils import format_date_ymd, yes_no
 
 
-REPORT_COLUMNS_VISIBLE = [
-	"REF",
-	"ETD (fecha)",
-	"Confirmed ETD",
-	"ETA (fecha)",
-	"Confirmed ETA",
-	"Booking",
-	"MBL",
-	"POL",
-	"T/S",
-	"POD",
-	"Final destination",
-	"Internal client number",
-	"ISF",
-	"Fecha de ISF",
-	"Customs clearance",
-	"Fecha de customs clearance",
-	"Empty return",
-	"Fecha de empty return",
+class ColumnSpec(NamedTuple):
+	"""One report column: source field path in the Order document (dotted; None for constants)
+	and an optional converter applied to the field value."""
+	column: str
+	field: Optional[str]
+	convert: Optional[Callable[[Any], Any]] = None
+
+
+def _first_stopover_name(stops: Any) -> Optional[str]:
+	if not isinstance(stops, list) or not stops:
+		return None
+	first = stops[0] or {}
+	return first.get("stopoverName") or first.get("name")
+
+
+def _object_id_str(value: Any) -> Optional[str]:
+	return str(value) if value is not None else None
+
+
+def _const(value: Any) -> Callable[[Any], Any]:
+	return lambda _: value
+
+
+# Report layout, in column order. Adding a column is one entry here.
+REPORT_COLUMN_SPECS: List[ColumnSpec] = [
+	ColumnSpec("REF", "number"),
+	ColumnSpec("ETD (fecha)", "dateETD", format_date_ymd),
+	ColumnSpec("Confirmed ETD", "isMANE", yes_no),  # ETD confirmado
+	ColumnSpec("ETA (fecha)", "dateETA", format_date_ymd),
+	ColumnSpec("Confirmed ETA", "isMANI", yes_no),  # ETA confirmado
+	ColumnSpec("Booking", "bookingNumber"),
+	ColumnSpec("MBL", "bookingNumber"),
+	ColumnSpec("POL", "origin"),
+	ColumnSpec("T/S", "stopovers", _first_stopover_name),
+	ColumnSpec("POD", "destination"),
+	ColumnSpec("Final destination", "destination"),
+	ColumnSpec("Internal client number", "internalClientNumber"),
+	ColumnSpec("ISF", "isISF", yes_no),
+	ColumnSpec("Fecha de ISF", "dateISF", format_date_ymd),
+	# Defaults for now
+	ColumnSpec("Customs clearance", None, _const("NO")),
+	ColumnSpec("Fecha de customs clearance", None, _const(None)),
+	ColumnSpec("Empty return", None, _const("NO")),
+	ColumnSpec("Fecha de empty return", None, _const(None)),
+	# Technical columns (hidden in the sheet)
+	ColumnSpec("orderId", "_id", _object_id_str),
+	ColumnSpec("__createdAt", "createdAt", format_date_ymd),
+	ColumnSpec("__lastUpdateAt", "dateLastUpdate", format_date_ymd),
 ]
 
 TECH_COLUMNS = [
@@ -30,63 +60,108 @@ TECH_COLUMNS = [
 	"__lastUpdateAt",
 ]
 
-REPORT_COLUMNS = REPORT_COLUMNS_VISIBLE + TECH_COLUMNS
+REPORT_COLUMNS = [spec.column for spec in REPORT_COLUMN_SPECS]
+REPORT_COLUMNS_VISIBLE = [c for c in REPORT_COLUMNS if c not in TECH_COLUMNS]
+
+
+class ReportRow(tuple):
+	"""Compact report row: a plain tuple of values in REPORT_COLUMNS order (no per-row dict or
+	__dict__), with dict-style read access by column name through a precomputed index."""
+
+	__slots__ = ()
+	columns: Tuple[str, ...] = tuple(REPORT_COLUMNS)
+	# not `index`, which would hide tuple.index
+	column_index: Dict[str, int] = {c: i for i, c in enumerate(REPORT_COLUMNS)}
+
+	def get(self, column: str, default: Any = None) -> Any:
+		i = self.column_index.get(column)
+		return self[i] if i is not None else default
+
+	@property
+	def order_id(self) -> Optional[str]:
+		val = self.get("orderId")
+		return str(val) if val is not None else None
+
+	@property
+	def created_at(self) -> Any:
+		return self.get("__createdAt")
+
+	@classmethod
+	def from_dict(cls, d: Dict[str, Any]) -> "ReportRow":
+		return cls(d.get(c) for c in cls.columns)
+
+	def to_dict(self) -> Dict[str, Any]:
+		return dict(zip(self.columns, self))
+
+
+# Anything the report writers accept as a row
+RowLike = Union[ReportRow, Dict[str, Any]]
+
+
+@lru_cache(maxsize=None)
+def _row_type(columns: Tuple[str, ...]) -> Type[ReportRow]:
+	if columns == ReportRow.columns:
+		return ReportRow
+	return type("ReportRow", (ReportRow,), {
+		"__slots__": (),
+		"columns": columns,
+		"column_index": {c: i for i, c in enumerate(columns)},
+	})
+
+
+def row_type_for(columns: Sequence[str]) -> Type[ReportRow]:
+	"""ReportRow for REPORT_COLUMNS, or a same-shaped row type for another column layout."""
+	return _row_type(tuple(columns))
+
+
+def row_values(row: RowLike, columns: Sequence[str]) -> Sequence[Any]:
+	"""Values of row in `columns` order, without copying when the row already has that layout."""
+	if isinstance(row, ReportRow) and row.columns == tuple(columns):
+		return row
+	return [row.get(c) for c in columns]
+
+
+def _compile_step(spec: ColumnSpec) -> Tuple[Optional[str], Optional[Callable[[Any], Any]]]:
+	"""Reduce a spec to (top-level key, converter of that key's value), nesting dotted paths into the converter."""
+	if spec.field is None or "." not in spec.field:
+		return spec.field, spec.convert
+	head, *rest = spec.field.split(".")
+	convert = spec.convert
+
+	def nested(value: Any) -> Any:
+		for p in rest:
+			if not isinstance(value, dict):
+				value = None
+				break
+			value = value.get(p)
+		return convert(value) if convert else value
+	return head, nested
+
+
+def compile_row_mapper(specs: List[ColumnSpec]) -> Callable[[Dict[str, Any]], ReportRow]:
+	"""Precompile specs into a function doc -> ReportRow (values in spec order)."""
+	steps = [_compile_step(s) for s in specs]
+	row_type = row_type_for([s.column for s in specs])
+
+	def to_row(doc: Dict[str, Any]) -> ReportRow:
+		get = doc.get
+		return row_type([get(key) if convert is None else convert(get(key)) for key, convert in steps])
+	return to_row
+
+
+doc_to_report_tuple = compile_row_mapper(REPORT_COLUMN_SPECS)
+
+
+def iter_report_row_tuples(docs: Iterable[Dict[str, Any]]) -> Iterator[ReportRow]:
+	"""Batch mapper: Mongo docs in, ready-to-append ReportRow tuples in REPORT_COLUMNS order out."""
+	to_row = doc_to_report_tuple
+	for doc in docs:
+		yield to_row(doc)
 
 
 def extract_first_stopover_name(doc: Dict[str, Any]) -> Optional[str]:
-	stops = doc.get("stopovers") or []
-	if not isinstance(stops, list) or not stops:
-		return None
-	first = stops[0] or {}
-	name = first.get("stopoverName") or first.get("name")
-	return name
+	return _first_stopover_name(doc.get("stopovers") or [])
 
 
 def map_doc_to_report_row(doc: Dict[str, Any]) -> Dict[str, Any]:
-	ref = doc.get("number")
-	etd = format_date_ymd(doc.get("dateETD"))
-	confirmed_etd = yes_no(doc.get("isMANE"))  # ETD confirmado
-	eta = format_date_ymd(doc.get("dateETA"))
-	confirmed_eta = yes_no(doc.get("isMANI"))  # ETA confirmado
-	booking = doc.get("bookingNumber")
-	mbl = doc.get("bookingNumber")
-	pol = doc.get("origin")
-	ts = extract_first_stopover_name(doc)
-	pod = doc.get("destination")
-	final_destination = doc.get("destination")
-	internal_client_number = doc.get("internalClientNumber")
-	isf = yes_no(doc.get("isISF"))
-	fecha_isf = format_date_ymd(doc.get("dateISF"))
-	# Defaults for now
-	customs_clearance = "NO"
-	fecha_customs_clearance = None
-	empty_return = "NO"
-	fecha_empty_return = None
-
-	order_id = str(doc.get("_id")) if doc.get("_id") is not None else None
-	created_at = format_date_ymd(doc.get("createdAt"))
-	last_update_at = format_date_ymd(doc.get("dateLastUpdate"))
-
-	return {
-		"REF": ref,
-		"ETD (fecha)": etd,
-		"Confirmed ETD": confirmed_etd,
-		"ETA (fecha)": eta,
-		"Confirmed ETA": confirmed_eta,
-		"Booking": booking,
-		"MBL": mbl,
-		"POL": pol,
-		"T/S": ts,
-		"POD": pod,
-		"Final destination": final_destination,
-		"Internal client number": internal_client_number,
-		"ISF": isf,
-		"Fecha de ISF": fecha_isf,
-		"Customs clearance": customs_clearance,
-		"Fecha de customs clearance": fecha_customs_clearance,
-		"Empty return": empty_return,
-		"Fecha de empty return": fecha_empty_return,
-		"orderId": order_id,
-		"__createdAt": created_at,
-		"__lastUpdateAt": last_update_at,
-	}
+	return dict(zip(REPORT_COLUMNS, doc_to_report_tuple(doc)))
@@ -0,0 +1,351 @@
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .mongo_mapping import ReportRow, RowLike, row_type_for, row_values
+
+
+STATE_DB_FILE = "order_sync_state.sqlite3"
+# Rows per executemany / IN (...) batch
+BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_state (
+	account_id TEXT PRIMARY KEY,
+	columns TEXT NOT NULL,
+	last_sync TEXT,
+	file_id TEXT,
+	head_revision_id TEXT,
+	md5 TEXT,
+	column_lengths TEXT
+);
+CREATE TABLE IF NOT EXISTS report_rows (
+	account_id TEXT NOT NULL,
+	order_id TEXT NOT NULL,
+	created_at TEXT NOT NULL,
+	row_json TEXT NOT NULL,
+	UNIQUE (account_id, order_id)
+);
+CREATE INDEX IF NOT EXISTS report_rows_by_created ON report_rows (account_id, created_at);
+CREATE TABLE IF NOT EXISTS rebuild_state (
+	account_id TEXT PRIMARY KEY,
+	columns TEXT NOT NULL,
+	started_at TEXT NOT NULL,
+	last_key TEXT,
+	row_count INTEGER NOT NULL DEFAULT 0,
+	column_lengths TEXT
+);
+CREATE TABLE IF NOT EXISTS rebuild_rows (
+	account_id TEXT NOT NULL,
+	order_id TEXT NOT NULL,
+	created_at TEXT NOT NULL,
+	row_json TEXT NOT NULL,
+	UNIQUE (account_id, order_id)
+);
+CREATE TABLE IF NOT EXISTS reload_rows (
+	account_id TEXT NOT NULL,
+	order_id TEXT NOT NULL,
+	created_at TEXT NOT NULL,
+	row_json TEXT NOT NULL,
+	UNIQUE (account_id, order_id)
+);
+"""
+
+# Columns added after a table was first shipped: created on open by older stores
+_ADDED_COLUMNS = [
+	("account_state", "column_lengths", "TEXT"),
+	("rebuild_state", "column_lengths", "TEXT"),
+]
+
+_UPSERT_ROW = (
+	"INSERT INTO {table} (account_id, order_id, created_at, row_json) VALUES (?, ?, ?, ?) "
+	"ON CONFLICT (account_id, order_id) DO UPDATE SET created_at = excluded.created_at, row_json = excluded.row_json"
+)
+
+
+@dataclass
+class AccountState:
+	account_id: str
+	columns: List[str]
+	last_sync: Optional[datetime]
+	file_id: Optional[str]
+	head_revision_id: Optional[str]
+	md5: Optional[str]
+	# longest text per column over the rows written so far (sizes the workbook's columns)
+	column_lengths: Optional[List[int]] = None
+
+	def matches(self, meta: Optional[Dict[str, Any]], columns: Sequence[str]) -> bool:
+		"""True if the stored rows are what the Drive file described by meta contains, in the same
+		column layout: i.e. the local store can be used instead of the workbook."""
+		if not meta or meta.get("id") != self.file_id or list(columns) != self.columns:
+			return False
+		rev = meta.get("headRevisionId")
+		if rev and self.head_revision_id:
+			return rev == self.head_revision_id
+		md5 = meta.get("md5Checksum")
+		return bool(md5) and md5 == self.md5
+
+
+@dataclass
+class RebuildCheckpoint:
+	"""Progress of a full rebuild: rows staged so far and the key of the last one (see
+	mongo_fetch.order_key). started_at becomes the account's last_sync once it finishes."""
+	account_id: str
+	columns: List[str]
+	started_at: datetime
+	last_key: Optional[str]
+	row_count: int
+	column_lengths: Optional[List[int]] = None
+
+
+def _encode_row(values: Sequence[Any]) -> str:
+	return json.dumps(list(values), default=str, separators=(",", ":"))
+
+
+def _grow_lengths(lengths: Optional[List[int]], rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> List[int]:
+	"""Running max text length per column (header included), grown with rows. Never shrinks."""
+	out = list(lengths) if lengths and len(lengths) == len(columns) else [len(c) for c in columns]
+	for values in rows:
+		for i, val in enumerate(values):
+			if val is not None:
+				n = len(val) if isinstance(val, str) else len(str(val))
+				if n > out[i]:
+					out[i] = n
+	return out
+
+
+def _decode_lengths(raw: Optional[str]) -> Optional[List[int]]:
+	return json.loads(raw) if raw else None
+
+
+def _batches(items: Iterable[Any], size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+	it = iter(items)
+	while True:
+		batch = list(islice(it, size))
+		if not batch:
+			return
+		yield batch
+
+
+class StateStore:
+	"""Per-account report rows, last_sync, column lengths and uploaded Drive revision in SQLite; full
+	rebuilds are staged with a checkpoint. One connection per thread."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._conns: List[sqlite3.Connection] = []
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			# each connection is only used by the thread that opened it; close() may run elsewhere
+			conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			conn.executescript(_SCHEMA)
+			self._migrate(conn)
+			self._local.conn = conn
+			with self._lock:
+				self._conns.append(conn)
+		return conn
+
+	@staticmethod
+	def _migrate(conn: sqlite3.Connection) -> None:
+		for table, column, kind in _ADDED_COLUMNS:
+			existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+			if column not in existing:
+				with conn:
+					conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+
+	def close(self) -> None:
+		"""Close every thread's connection (call once the run is over)."""
+		with self._lock:
+			conns, self._conns = self._conns, []
+		for conn in conns:
+			conn.close()
+		self._local = threading.local()
+
+	def __enter__(self) -> "StateStore":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self.close()
+
+	def get(self, account_id: str) -> Optional[AccountState]:
+		row = self._conn().execute(
+			"SELECT columns, last_sync, file_id, head_revision_id, md5, column_lengths FROM account_state WHERE account_id = ?",
+			(account_id,),
+		).fetchone()
+		if row is None:
+			return None
+		columns, last_sync, file_id, rev, md5, lengths = row
+		try:
+			when = datetime.fromisoformat(last_sync) if last_sync else None
+		except ValueError:
+			when = None
+		return AccountState(account_id, json.loads(columns), when, file_id, rev, md5, _decode_lengths(lengths))
+
+	def replace_rows(self, account_id: str, rows: Iterable[Sequence[Any]], columns: Sequence[str], last_sync: datetime, meta: Optional[Dict[str, Any]] = None) -> int:
+		"""Replace all of the account's rows (values in `columns` order, already in report order).
+		meta, when given, is the Drive file these rows were read from. rows is read outside any
+		transaction (staged in reload_rows); only the final swap holds the write lock. Returns the row count."""
+		oid_idx = list(columns).index("orderId")
+		created_idx = list(columns).index("__createdAt")
+		sql = _UPSERT_ROW.format(table="reload_rows")
+		conn = self._conn()
+		lengths = _grow_lengths(None, [], columns)
+		with conn:
+			conn.execute("DELETE FROM reload_rows WHERE account_id = ?", (account_id,))
+		for batch in _batches(rows):
+			kept = [r for r in batch if r[oid_idx] is not None]
+			params = [(account_id, str(r[oid_idx]), str(r[created_idx] or ""), _encode_row(r)) for r in kept]
+			lengths = _grow_lengths(lengths, kept, columns)
+			with conn:
+				# duplicated orderIds: the last one wins, like the workbook merge
+				conn.executemany(sql, params)
+		with conn:
+			conn.execute("DELETE FROM report_rows WHERE account_id = ?", (account_id,))
+			count = conn.execute(
+				"INSERT INTO report_rows (account_id, order_id, created_at, row_json) "
+				"SELECT account_id, order_id, created_at, row_json FROM reload_rows WHERE account_id = ? ORDER BY rowid",
+				(account_id,),
+			).rowcount
+			conn.execute("DELETE FROM reload_rows WHERE account_id = ?", (account_id,))
+			self._set_state(conn, account_id, columns, last_sync, meta, lengths)
+		return count
+
+	def upsert_rows(self, account_id: str, changed_rows: List[RowLike], columns: Sequence[str], last_sync: datetime) -> Tuple[List[str], List[str]]:
+		"""Insert or update rows by orderId and advance last_sync, in one transaction. Clears the
+		recorded Drive revision until the rendered workbook is uploaded. Returns (created_ids, updated_ids)."""
+		latest: Dict[str, Sequence[Any]] = {}
+		for r in changed_rows:
+			key = str(r.get("orderId")) if r.get("orderId") is not None else None
+			if key:
+				latest[key] = row_values(r, columns)
+		created_idx = list(columns).index("__createdAt")
+		conn = self._conn()
+		existing = set()
+		for batch in _batches(latest):
+			marks = ",".join("?" * len(batch))
+			existing.update(oid for (oid,) in conn.execute(
+				f"SELECT order_id FROM report_rows WHERE account_id = ? AND order_id IN ({marks})",
+				[account_id, *batch],
+			))
+		created_ids = [k for k in latest if k not in existing]
+		updated_ids = [k for k in latest if k in existing]
+		state = self.get(account_id)
+		previous = state.column_lengths if state is not None and state.columns == list(columns) else None
+		with conn:
+			conn.executemany(
+				_UPSERT_ROW.format(table="report_rows"),
+				[(account_id, k, str(v[created_idx] or ""), _encode_row(v)) for k, v in latest.items()],
+			)
+			self._set_state(conn, account_id, columns, last_sync, None, _grow_lengths(previous, latest.values(), columns) if previous else None)
+		return created_ids, updated_ids
+
+	def _set_state(self, conn: sqlite3.Connection, account_id: str, columns: Sequence[str], last_sync: datetime, meta: Optional[Dict[str, Any]], column_lengths: Optional[List[int]]) -> None:
+		meta = meta or {}
+		conn.execute(
+			"INSERT INTO account_state (account_id, columns, last_sync, file_id, head_revision_id, md5, column_lengths) VALUES (?, ?, ?, ?, ?, ?, ?) "
+			"ON CONFLICT (account_id) DO UPDATE SET columns = excluded.columns, last_sync = excluded.last_sync, "
+			"file_id = excluded.file_id, head_revision_id = excluded.head_revision_id, md5 = excluded.md5, column_lengths = excluded.column_lengths",
+			(account_id, json.dumps(list(columns)), last_sync.isoformat(), meta.get("id"), meta.get("headRevisionId"), meta.get("md5Checksum"), json.dumps(column_lengths) if column_lengths else None),
+		)
+
+	def set_remote(self, account_id: str, meta: Dict[str, Any]) -> None:
+		"""Record the Drive file/revision holding the current rows (call after a successful upload)."""
+		conn = self._conn()
+		with conn:
+			conn.execute(
+				"UPDATE account_state SET file_id = ?, head_revision_id = ?, md5 = ? WHERE account_id = ?",
+				(meta.get("id"), meta.get("headRevisionId"), meta.get("md5Checksum"), account_id),
+			)
+
+	def get_rebuild(self, account_id: str) -> Optional[RebuildCheckpoint]:
+		"""The account's unfinished full rebuild, if any."""
+		row = self._conn().execute(
+			"SELECT columns, started_at, last_key, row_count, column_lengths FROM rebuild_state WHERE account_id = ?",
+			(account_id,),
+		).fetchone()
+		if row is None:
+			return None
+		columns, started_at, last_key, row_count, lengths = row
+		return RebuildCheckpoint(account_id, json.loads(columns), datetime.fromisoformat(started_at), last_key, row_count, _decode_lengths(lengths))
+
+	def start_rebuild(self, account_id: str, columns: Sequence[str], started_at: datetime) -> RebuildCheckpoint:
+		"""Start (or restart) a full rebuild, dropping any rows staged by a previous one."""
+		conn = self._conn()
+		with conn:
+			conn.execute("DELETE FROM rebuild_rows WHERE account_id = ?", (account_id,))
+			conn.execute(
+				"INSERT INTO rebuild_state (account_id, columns, started_at, last_key, row_count, column_lengths) VALUES (?, ?, ?, NULL, 0, NULL) "
+				"ON CONFLICT (account_id) DO UPDATE SET columns = excluded.columns, started_at = excluded.started_at, last_key = NULL, row_count = 0, column_lengths = NULL",
+				(account_id, json.dumps(list(columns)), started_at.isoformat()),
+			)
+		return RebuildCheckpoint(account_id, list(columns), started_at, None, 0)
+
+	def stage_rebuild_rows(self, account_id: str, rows: Iterable[Tuple[Sequence[Any], Any]], columns: Sequence[str], key: Callable[[Any], str]) -> int:
+		"""Append (row, marker) pairs to the rebuild in progress. Each batch is committed together
+		with key(marker) of its last pair as the checkpoint, so a crash loses at most one batch.
+		Returns the number of rows staged."""
+		oid_idx = list(columns).index("orderId")
+		created_idx = list(columns).index("__createdAt")
+		sql = _UPSERT_ROW.format(table="rebuild_rows")
+		conn = self._conn()
+		checkpoint = self.get_rebuild(account_id)
+		lengths = checkpoint.column_lengths if checkpoint is not None else None
+		count = 0
+		for batch in _batches(rows):
+			kept = [r for r, _ in batch if r[oid_idx] is not None]
+			params = [(account_id, str(r[oid_idx]), str(r[created_idx] or ""), _encode_row(r)) for r in kept]
+			lengths = _grow_lengths(lengths, kept, columns)
+			with conn:
+				conn.executemany(sql, params)
+				conn.execute(
+					"UPDATE rebuild_state SET last_key = ?, row_count = row_count + ?, column_lengths = ? WHERE account_id = ?",
+					(key(batch[-1][1]), len(params), json.dumps(lengths), account_id),
+				)
+			count += len(batch)
+		return count
+
+	def finish_rebuild(self, account_id: str) -> int:
+		"""Replace the account's rows with the staged ones in one transaction, with last_sync set to
+		the rebuild's started_at (changes made while it ran are picked up by the next incremental).
+		Returns the row count."""
+		checkpoint = self.get_rebuild(account_id)
+		if checkpoint is None:
+			raise LookupError(f"no rebuild in progress for {account_id}")
+		conn = self._conn()
+		with conn:
+			conn.execute("DELETE FROM report_rows WHERE account_id = ?", (account_id,))
+			# staging rowid order is fetch order, so ties on created_at keep it, like replace_rows
+			count = conn.execute(
+				"INSERT INTO report_rows (account_id, order_id, created_at, row_json) "
+				"SELECT account_id, order_id, created_at, row_json FROM rebuild_rows WHERE account_id = ? ORDER BY rowid",
+				(account_id,),
+			).rowcount
+			conn.execute("DELETE FROM rebuild_rows WHERE account_id = ?", (account_id,))
+			conn.execute("DELETE FROM rebuild_state WHERE account_id = ?", (account_id,))
+			self._set_state(conn, account_id, checkpoint.columns, checkpoint.started_at, None, checkpoint.column_lengths or _grow_lengths(None, [], checkpoint.columns))
+		return count
+
+	def iter_rows(self, account_id: str, columns: Sequence[str]) -> Iterator[ReportRow]:
+		"""The account's rows in report order (__createdAt asc, ties in insertion order), streamed."""
+		row_type = row_type_for(columns)
+		cursor = self._conn().execute(
+			"SELECT row_json FROM report_rows WHERE account_id = ? ORDER BY created_at, rowid",
+			(account_id,),
+		)
+		try:
+			for (row_json,) in cursor:
+				yield row_type(json.loads(row_json))
+		finally:
+			cursor.close()
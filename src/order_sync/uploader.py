@@ -0,0 +1,64 @@
+import itertools
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from .excel_sync import WorkbookSource
+
+
+class BackgroundUploader:
+	"""One background thread uploading submitted workbooks; submit() blocks while `max_pending` are
+	waiting. Failures are recorded per account in `errors`."""
+
+	def __init__(self, max_pending: int = 2, name: str = "order-sync-upload") -> None:
+		self._queue: "queue.Queue[Optional[Tuple[str, WorkbookSource, Callable[[WorkbookSource], None]]]]" = queue.Queue(maxsize=max(1, max_pending))
+		self._staging = tempfile.TemporaryDirectory(prefix="order_sync_upload_")
+		self._seq = itertools.count()
+		self._lock = threading.Lock()
+		self.errors: Dict[str, str] = {}
+		self.seconds: Dict[str, float] = {}
+		self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+		self._thread.start()
+
+	def submit(self, account_id: str, workbook: WorkbookSource, upload: Callable[[WorkbookSource], None]) -> None:
+		"""Queue upload(workbook) for account_id. A path is first moved into the uploader's staging
+		dir (the caller's temp dir may go away); a file object is taken over and closed once uploaded."""
+		if isinstance(workbook, Path):
+			job_dir = Path(self._staging.name) / str(next(self._seq))
+			job_dir.mkdir()
+			staged = job_dir / workbook.name
+			shutil.move(str(workbook), str(staged))
+			workbook = staged
+		self._queue.put((account_id, workbook, upload))
+
+	def _run(self) -> None:
+		while True:
+			job = self._queue.get()
+			if job is None:
+				return
+			account_id, staged, upload = job
+			started = time.perf_counter()
+			try:
+				upload(staged)
+			except Exception as e:
+				with self._lock:
+					self.errors[account_id] = f"{type(e).__name__}: {e}"
+			finally:
+				with self._lock:
+					self.seconds[account_id] = self.seconds.get(account_id, 0.0) + time.perf_counter() - started
+				if isinstance(staged, Path):
+					shutil.rmtree(str(staged.parent), ignore_errors=True)
+				else:
+					staged.close()
+
+	def close(self) -> Dict[str, str]:
+		"""Wait for all queued uploads and stop the thread. Returns {account_id: error}."""
+		self._queue.put(None)
+		self._thread.join()
+		self._staging.cleanup()
+		with self._lock:
+			return dict(self.errors)
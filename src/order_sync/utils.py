@@ -1,14 +1,46 @@
 import json
+import os
+from contextlib import contextmanager
 from datetime import datetime, date
+from functools import lru_cache
+from pathlib import Path
 from dateutil import parser as dtparser
-from typing import Any, Dict, Iterable, List, Optional
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
 
 
 ISO_FORMAT = "%Y-%m-%d"
+# Distinct date strings remembered by the coercion helpers (many orders share ETD/ETA dates)
+DATE_CACHE_SIZE = 4096
+
+
+def _parse_iso_fast(value: str) -> Optional[datetime]:
+	"""Strict ISO-8601 parse via datetime.fromisoformat (also accepting a trailing 'Z'); None if not ISO."""
+	s = value.strip()
+	if s[-1:] in ("Z", "z"):
+		s = s[:-1] + "+00:00"
+	try:
+		return datetime.fromisoformat(s)
+	except ValueError:
+		return None
 
 
 def parse_iso_datetime(value: str) -> datetime:
-	return dtparser.parse(value)
+	"""Parse a datetime string: ISO-8601 fast path, dateutil for any other format."""
+	return _parse_iso_fast(value) or dtparser.parse(value)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _coerce_datetime_string(value: str) -> Optional[datetime]:
+	try:
+		return parse_iso_datetime(value)
+	except Exception:
+		return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _format_ymd_string(value: str) -> Optional[str]:
+	dt = _coerce_datetime_string(value)
+	return dt.date().isoformat() if dt else None
 
 
 def is_same_day(dt: datetime, day: date) -> bool:
@@ -48,22 +80,39 @@ def coerce_datetime_like(value: Any) -> Optional[datetime]:
 	if isinstance(value, datetime):
 		return value
 	if isinstance(value, dict) and "$date" in value:
-		try:
-			return parse_iso_datetime(str(value["$date"]))
-		except Exception:
-			return None
+		return _coerce_datetime_string(str(value["$date"]))
 	if isinstance(value, str):
-		try:
-			return parse_iso_datetime(value)
-		except Exception:
-			return None
+		return _coerce_datetime_string(value)
 	return None
 
 
 def format_date_ymd(value: Any) -> Optional[str]:
+	if isinstance(value, datetime):
+		return value.date().isoformat()
+	if isinstance(value, str):
+		return _format_ymd_string(value)
 	dt = coerce_datetime_like(value)
 	return dt.date().isoformat() if dt else None
 
 
+@contextmanager
+def atomic_write(path: Path, mode: str = "w") -> Iterator[IO[Any]]:
+	"""Write path through a temp file next to it that replaces it (os.replace) once the block
+	completes, so readers never see a partial file. Text modes use UTF-8; on error the temp file
+	is removed and path is left as it was."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp = path.with_name(path.name + ".tmp")
+	try:
+		with open(tmp, mode, encoding=None if "b" in mode else "utf-8") as f:
+			yield f
+		os.replace(str(tmp), str(path))
+	except BaseException:
+		try:
+			tmp.unlink()
+		except OSError:
+			pass
+		raise
+
+
 def yes_no(value: Any) -> str:
 	return "YES" if bool(value) else "NO"
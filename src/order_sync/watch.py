@@ -0,0 +1,164 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pymongo.errors import OperationFailure
+
+from .mongo_fetch import MongoSession, watch_order_logs
+from .utils import atomic_write
+
+
+RESUME_TOKEN_FILE = "watch_resume_token.json"
+
+
+class ResumeTokenStore:
+	"""Change stream resume token persisted as JSON (written atomically), with the accounts whose
+	last sync failed (they still owe the events before the token)."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+
+	def _read(self) -> Dict[str, Any]:
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def load(self) -> Optional[Dict[str, Any]]:
+		return self._read().get("resume_token")
+
+	def load_retry_accounts(self) -> List[str]:
+		return list(self._read().get("retry_accounts") or [])
+
+	def save(self, token: Optional[Dict[str, Any]], retry_accounts: Iterable[str] = ()) -> None:
+		if token is None:
+			return
+		with atomic_write(self.path) as f:
+			json.dump({"resume_token": token, "retry_accounts": sorted(retry_accounts)}, f)
+
+	def clear(self) -> None:
+		try:
+			self.path.unlink()
+		except OSError:
+			pass
+
+
+# longest wait between retries of an account whose sync keeps failing
+MAX_RETRY_DELAY = 900.0
+
+
+class AccountDebouncer:
+	"""Per-account debounce: an account becomes due once it has been quiet for `debounce` seconds,
+	or `max_delay` seconds after its first pending event, whichever comes first. After a failed
+	sync it is not due again for `retry_delay` seconds, doubling per consecutive failure up to
+	`max_retry_delay`."""
+
+	def __init__(self, debounce: float, max_delay: float, retry_delay: float = 30.0, max_retry_delay: float = MAX_RETRY_DELAY, clock: Callable[[], float] = time.monotonic) -> None:
+		self.debounce = debounce
+		self.max_delay = max_delay
+		self.retry_delay = retry_delay
+		self.max_retry_delay = max_retry_delay
+		self.clock = clock
+		self._first: Dict[str, float] = {}
+		self._last: Dict[str, float] = {}
+		self._failures: Dict[str, int] = {}
+		self._retry_at: Dict[str, float] = {}
+
+	def touch(self, account_id: str) -> None:
+		now = self.clock()
+		self._first.setdefault(account_id, now)
+		self._last[account_id] = now
+
+	def due(self) -> List[str]:
+		now = self.clock()
+		return [
+			acc for acc, last in self._last.items()
+			if now >= self._retry_at.get(acc, now)
+			and (now - last >= self.debounce or now - self._first[acc] >= self.max_delay)
+		]
+
+	def failed(self, account_id: str) -> float:
+		"""Record a failed sync: the account stays pending and is retried after the returned delay."""
+		now = self.clock()
+		self._first.setdefault(account_id, now)
+		self._last.setdefault(account_id, now)
+		failures = self._failures.get(account_id, 0) + 1
+		self._failures[account_id] = failures
+		delay = min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+		self._retry_at[account_id] = now + delay
+		return delay
+
+	def done(self, account_id: str) -> None:
+		self._first.pop(account_id, None)
+		self._last.pop(account_id, None)
+		self._failures.pop(account_id, None)
+		self._retry_at.pop(account_id, None)
+
+	@property
+	def pending(self) -> bool:
+		return bool(self._last)
+
+	@property
+	def waiting(self) -> bool:
+		"""Some account has events no sync has been attempted for yet."""
+		return any(acc not in self._failures for acc in self._last)
+
+	@property
+	def failed_accounts(self) -> List[str]:
+		return sorted(self._failures)
+
+
+def run_watch(
+	session: MongoSession,
+	account_ids: List[str],
+	sync_account: Callable[[str], bool],
+	tokens: ResumeTokenStore,
+	debounce: float = 5.0,
+	max_delay: float = 60.0,
+	retry_delay: float = 30.0,
+	max_await_time_ms: int = 1000,
+	should_stop: Callable[[], bool] = lambda: False,
+	log: Callable[[str], None] = print,
+	clock: Callable[[], float] = time.monotonic,
+) -> None:
+	"""Follow OrderLog inserts for account_ids and sync each touched account once its events settle,
+	retrying failures with backoff. sync_account(account_id) returns True on success."""
+	token = tokens.load()
+	catch_up = account_ids if token is None else [acc for acc in tokens.load_retry_accounts() if acc in account_ids]
+	try:
+		stream = watch_order_logs(session, account_ids, resume_after=token, max_await_time_ms=max_await_time_ms)
+	except OperationFailure as e:
+		if token is None:
+			raise
+		log(f"WARN: cannot resume change stream ({e}); starting from now")
+		tokens.clear()
+		catch_up = account_ids
+		stream = watch_order_logs(session, account_ids, max_await_time_ms=max_await_time_ms)
+
+	debouncer = AccountDebouncer(debounce, max_delay, retry_delay=retry_delay, clock=clock)
+
+	def attempt(acc: str) -> None:
+		if sync_account(acc):
+			debouncer.done(acc)
+		else:
+			log(f"WARN: sync failed for {acc}; retrying in {debouncer.failed(acc):.0f}s")
+
+	# stream is already open, so anything written during the catch-up is still seen
+	for acc in catch_up:
+		attempt(acc)
+	saved = (token, tokens.load_retry_accounts() if token is not None else [])
+	with stream:
+		while not should_stop() and stream.alive:
+			change = stream.try_next()
+			if change is not None:
+				acc = (change.get("fullDocument") or {}).get("accountId")
+				if acc is not None:
+					debouncer.touch(str(acc))
+			for acc in debouncer.due():
+				attempt(acc)
+			current = (stream.resume_token, debouncer.failed_accounts)
+			if not debouncer.waiting and current[0] is not None and current != saved:
+				tokens.save(*current)
+				saved = current
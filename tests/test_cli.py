@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from benchmarks.fakes import FakeDrive, FakeMongoSession
+from benchmarks.synthetic import BENCH_ACCOUNT_ID, make_account, make_orders
+from order_sync import cli
+from order_sync.config import Config
+from order_sync.drive import DriveFolderIndex
+from order_sync.metrics import AccountMetrics
+from order_sync.state_store import STATE_DB_FILE, StateStore
+
+
+FOLDER_ID = "folder"
+
+
+def _config(output_dir: Path, workbook_memory_limit: int) -> Config:
+	return Config(
+		mongo_uri="mongodb://test",
+		output_dir=str(output_dir),
+		timezone=None,
+		drive_client_email=None,
+		drive_private_key=None,
+		drive_folder_id=FOLDER_ID,
+		account_ids=[str(BENCH_ACCOUNT_ID)],
+		ref_prefixes=[],
+		account_ids_no_prefix=[],
+		workbook_memory_limit=workbook_memory_limit,
+	)
+
+
+@pytest.mark.parametrize("workbook_memory_limit", [1 << 20, 0])
+def test_account_name_with_slash_keeps_one_drive_file(tmp_path: Path, workbook_memory_limit: int) -> None:
+	session = FakeMongoSession(make_orders(20, BENCH_ACCOUNT_ID), [], [make_account(name="ACME S/A")])
+	drive = FakeDrive()
+	cfg = _config(tmp_path, workbook_memory_limit)
+	now = datetime(2026, 1, 1)
+	modes = []
+	for run in range(3):
+		metrics = AccountMetrics(str(BENCH_ACCOUNT_ID))
+		index = DriveFolderIndex.load(drive, FOLDER_ID)
+		with StateStore(tmp_path / STATE_DB_FILE) as store:
+			cli._sync_account(cli.RunContext(cfg, session, store, tmp_path, now + timedelta(hours=run), index=index), drive, str(BENCH_ACCOUNT_ID), metrics)
+		modes.append(metrics.mode)
+	assert [f["name"] for f in drive.stored.values()] == ["ACME S/A.xlsx"]
+	assert modes == ["full", "unchanged", "unchanged"]
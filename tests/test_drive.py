@@ -0,0 +1,24 @@
+import socket
+
+import pytest
+
+from order_sync.drive import is_rejected_request_error, is_retryable_error, with_retries
+
+
+@pytest.mark.parametrize("exc", [socket.timeout("timed out"), TimeoutError(), ConnectionResetError()])
+def test_transport_errors_are_retried_except_for_creates(exc: BaseException) -> None:
+	assert is_retryable_error(exc)
+	assert not is_rejected_request_error(exc)
+
+
+def test_with_retries_retries_socket_timeouts() -> None:
+	calls = []
+
+	def flaky() -> str:
+		calls.append(1)
+		if len(calls) < 3:
+			raise socket.timeout("timed out")
+		return "ok"
+
+	assert with_retries(flaky, max_retries=3, sleep=lambda s: None) == "ok"
+	assert len(calls) == 3
@@ -0,0 +1,167 @@
+import zipfile
+from datetime import date, datetime, time
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from order_sync.excel_sync import META_SHEET_NAME, REPORT_SHEET_NAME, ReportWorkbook, _iter_sheet_values, _iter_sheet_values_openpyxl, iter_report_columns
+
+
+def _openpyxl_values(path: Path, sheet_name: str):
+	return list(_iter_sheet_values_openpyxl(path, sheet_name))
+
+
+def test_reads_openpyxl_written_workbook(tmp_path: Path) -> None:
+	path = tmp_path / "report.xlsx"
+	wb = Workbook()
+	ws = wb.active
+	ws.title = REPORT_SHEET_NAME
+	ws.append(["orderId", "total", "paid", "ETD (fecha)", "when", "note"])
+	ws.append(["A1", 12, True, "2026-01-02", datetime(2026, 1, 2, 3, 4, 5), None])
+	ws.append(["A2", 1.5, False, None, date(2025, 12, 31), "x"])
+	ws["E3"].number_format = "yyyy-mm-dd"
+	ws.append([None, None, None, None, None, "gap"])
+	wb.save(path)
+
+	values = list(_iter_sheet_values(path, REPORT_SHEET_NAME))
+	assert values[1][4] == datetime(2026, 1, 2, 3, 4, 5)
+	assert values[2][4] == datetime(2025, 12, 31)
+	# same values as openpyxl's own reader (trailing empty cells aside)
+	expected = _openpyxl_values(path, REPORT_SHEET_NAME)
+	assert [tuple(v) for v in values] == [tuple(r[:len(v)]) for r, v in zip(expected, values)]
+	assert list(iter_report_columns(path, ["total", "orderId", "missing"])) == [
+		(12, "A1", None),
+		(1.5, "A2", None),
+		(None, None, None),
+	]
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<workbookPr{pr}/>
+<sheets><sheet name="report" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+
+# xf 0: General, 1: custom date format, 2: builtin time format (h:mm), 3: builtin date (14), 4: duration
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/><numFmt numFmtId="165" formatCode="[h]:mm:ss"/></numFmts>
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="5">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="20" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+# Japanese text with its phonetic (furigana) run, as Excel stores it; a rich-text string in two runs
+_SHARED_STRINGS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="6" uniqueCount="6">
+<si><t>orderId</t></si>
+<si><t>ETD</t></si>
+<si><t>notes</t></si>
+<si><t>東京</t><rPh sb="0" eb="2"><t>トウキョウ</t></rPh><phoneticPr fontId="1"/></si>
+<si><r><t>Hello </t></r><r><rPr><b/></rPr><t>world</t></r></si>
+<si><t xml:space="preserve"> padded </t></si>
+</sst>"""
+
+_SHEET = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetData>
+<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c><c r="D1" t="str"><v>when</v></c><c r="E1" t="inlineStr"><is><t>time</t></is></c><c r="F1" t="inlineStr"><is><t>held</t></is></c></row>
+<row r="2"><c r="A2"><v>1001</v></c><c r="B2" s="1"><v>46024</v></c><c r="C2" t="s"><v>3</v></c><c r="D2" s="3"><v>46024.5</v></c><c r="E2" s="2"><v>0.75</v></c><c r="F2" s="4"><v>1.5</v></c></row>
+<row r="4"><c r="A4" t="inlineStr"><is><t>東京</t><rPh sb="0" eb="2"><t>トウキョウ</t></rPh></is></c><c r="C4" t="s"><v>4</v></c><c r="D4" s="0"><v>46024</v></c></row>
+<row r="5"><c r="B5" t="s"><v>5</v></c><c r="C5" t="b"><v>1</v></c></row>
+</sheetData>
+</worksheet>"""
+
+
+def _excel_style_package(path: Path, date1904: bool = False) -> Path:
+	with zipfile.ZipFile(path, "w") as zf:
+		zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+		zf.writestr("_rels/.rels", _ROOT_RELS)
+		zf.writestr("xl/workbook.xml", _WORKBOOK.format(pr=' date1904="1"' if date1904 else ""))
+		zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+		zf.writestr("xl/styles.xml", _STYLES)
+		zf.writestr("xl/sharedStrings.xml", _SHARED_STRINGS)
+		zf.writestr("xl/worksheets/sheet1.xml", _SHEET)
+	return path
+
+
+def test_reads_excel_style_workbook(tmp_path: Path) -> None:
+	path = _excel_style_package(tmp_path / "excel.xlsx")
+	values = list(_iter_sheet_values(path, REPORT_SHEET_NAME))
+	assert values[0] == ("orderId", "ETD", "notes", "when", "time", "held")
+	# date formats (custom and builtin) come back as datetimes/times, General numbers stay numbers
+	assert values[1][:5] == (1001, datetime(2026, 1, 2), "東京", datetime(2026, 1, 2, 12), time(18))
+	assert values[1][5].total_seconds() == 36 * 3600
+	# phonetic runs are skipped, rich-text runs joined, whitespace kept
+	assert values[2] == ("東京", None, "Hello world", 46024)
+	assert values[3] == (None, " padded ", True)
+	# the fallback reader agrees (it also yields the missing row 3 as an empty row)
+	expected = [row for row in _openpyxl_values(path, REPORT_SHEET_NAME) if any(v is not None for v in row)]
+	assert [row[:len(v)] for row, v in zip(expected, values)] == values
+
+
+def test_reads_1904_dates(tmp_path: Path) -> None:
+	path = _excel_style_package(tmp_path / "mac.xlsx", date1904=True)
+	values = list(_iter_sheet_values(path, REPORT_SHEET_NAME))
+	assert values[1][1] == datetime(2030, 1, 3)
+	assert values[1][1] == load_workbook(path)[REPORT_SHEET_NAME]["B2"].value
+
+
+REPORT_ROWS = [(f"o{i}", "2026-01-02", "x" * (i % 50), i) for i in range(300)]
+REPORT_COLUMNS = ["orderId", "ETD (fecha)", "note", "total"]
+
+
+# 1 MiB keeps the workbook in memory, 1 KiB makes it spill to a temp file
+@pytest.mark.parametrize("memory_limit", [1 << 20, 1024])
+def test_memory_backed_workbook_reads_back(tmp_path: Path, memory_limit: int) -> None:
+	last_sync = datetime(2026, 1, 2, 3, 4, 5)
+	with ReportWorkbook(tmp_path / "acc.xlsx", memory_limit=memory_limit) as report:
+		assert report.rebuild(iter(REPORT_ROWS), REPORT_COLUMNS, last_sync) == len(REPORT_ROWS)
+		assert not (tmp_path / "acc.xlsx").exists()
+		assert report.size > 0
+		assert report.sheetnames == [REPORT_SHEET_NAME, META_SHEET_NAME]
+		assert report.has_report
+		assert report.last_sync() == last_sync
+		assert list(iter_report_columns(report.source, ["total", "orderId"])) == [(r[3], r[0]) for r in REPORT_ROWS]
+		assert load_workbook(report.source)[REPORT_SHEET_NAME].max_row == len(REPORT_ROWS) + 1
+
+		# a download into the buffer replaces the previous package
+		report.source.seek(0)
+		package = report.source.read()
+		with ReportWorkbook(tmp_path / "other.xlsx", memory_limit=memory_limit) as downloaded:
+			with downloaded.open_writer() as fh:
+				fh.write(package)
+			assert downloaded.last_sync() == last_sync
+			assert len(list(iter_report_columns(downloaded.source, REPORT_COLUMNS))) == len(REPORT_ROWS)
@@ -0,0 +1,66 @@
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+from bson import ObjectId
+
+from benchmarks.fakes import FakeMongoSession
+from benchmarks.synthetic import BENCH_ACCOUNT_ID, EPOCH, make_orders
+from order_sync.mongo_fetch import iter_orders_keyset, iter_orders_partitioned, order_key
+
+
+OTHER_ACCOUNT_ID = ObjectId("64b0c0ffee00000000000002")
+
+
+def _session() -> FakeMongoSession:
+	"""230 orders for the account, most sharing their createdAt with others, 13 with a null
+	createdAt and one without the field, stored in reverse; plus another account's orders."""
+	orders = make_orders(230, BENCH_ACCOUNT_ID, seed=7)
+	for i, doc in enumerate(orders):
+		doc["createdAt"] = EPOCH + timedelta(minutes=(i * 7) // 13 % 40)
+		if i % 19 == 0:
+			doc["createdAt"] = None
+	del orders[5]["createdAt"]
+	orders.reverse()
+	others = make_orders(40, OTHER_ACCOUNT_ID, seed=8)
+	return FakeMongoSession(orders + others, [], [])
+
+
+def _ids(docs: List[Dict[str, Any]]) -> List[ObjectId]:
+	return [doc["_id"] for doc in docs]
+
+
+def _chained(session: FakeMongoSession, limit: Optional[int], **kwargs: Any) -> List[Dict[str, Any]]:
+	"""Every order, read the way successive capped runs do: each resumes after the last key."""
+	docs: List[Dict[str, Any]] = []
+	after_key = None
+	while True:
+		batch = list(iter_orders_partitioned(session, str(BENCH_ACCOUNT_ID), after_key=after_key, limit=limit, **kwargs))
+		if limit:
+			assert len(batch) <= limit
+		docs.extend(batch)
+		if not batch or not limit:
+			return docs
+		after_key = order_key(batch[-1])
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+@pytest.mark.parametrize("range_size", [9, 25, 500])
+@pytest.mark.parametrize("limit", [None, 7, 30, 64, 229, 1000])
+def test_partitioned_matches_keyset_across_chained_runs(workers: int, range_size: int, limit: Optional[int]) -> None:
+	session = _session()
+	expected = list(iter_orders_keyset(session, str(BENCH_ACCOUNT_ID), page_size=11))
+	assert len(expected) == 230
+	created = [doc.get("createdAt") for doc in expected]
+	assert created[:14] == [None] * 14 and len(set(created)) < 100
+	docs = _chained(session, limit, workers=workers, range_size=range_size)
+	assert _ids(docs) == _ids(expected)
+
+
+@pytest.mark.parametrize("limit", [None, 40])
+def test_partitioned_resumes_after_a_null_created_at_key(limit: Optional[int]) -> None:
+	session = _session()
+	expected = list(iter_orders_keyset(session, str(BENCH_ACCOUNT_ID)))
+	after_key = order_key(expected[4])
+	docs = list(iter_orders_partitioned(session, str(BENCH_ACCOUNT_ID), after_key=after_key, limit=limit, workers=3, range_size=10))
+	assert _ids(docs) == _ids(expected[5:5 + limit if limit else None])
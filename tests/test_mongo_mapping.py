@@ -0,0 +1,16 @@
+from order_sync.mongo_mapping import REPORT_COLUMN_SPECS, REPORT_COLUMNS, ReportRow, compile_row_mapper, row_type_for
+
+
+def test_report_row_keeps_tuple_methods() -> None:
+	row = ReportRow.from_dict({"orderId": "o1", "__createdAt": "2026-01-01"})
+	assert row.get("orderId") == "o1"
+	assert row.get("missing", 0) == 0
+	assert row.index("o1") == REPORT_COLUMNS.index("orderId")
+	assert row.count(None) == len(REPORT_COLUMNS) - 2
+
+	other = row_type_for(["b", "a"])(["x", "y"])
+	assert other.get("a") == "y"
+	assert other.index("y") == 1
+
+	mapped = compile_row_mapper(REPORT_COLUMN_SPECS[:1])({})
+	assert mapped.index(mapped[0]) == 0
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple
+
+import pytest
+
+from benchmarks.synthetic import BENCH_ACCOUNT_ID, make_orders
+from order_sync.mongo_fetch import order_key
+from order_sync.mongo_mapping import REPORT_COLUMNS, doc_to_report_tuple
+from order_sync.state_store import AccountState, StateStore
+
+
+NOW = datetime(2026, 1, 1)
+
+
+def _row(order_id: str, created_at: str, **values: object) -> List[object]:
+	row: List[object] = [None] * len(REPORT_COLUMNS)
+	row[REPORT_COLUMNS.index("orderId")] = order_id
+	row[REPORT_COLUMNS.index("__createdAt")] = created_at
+	for column, value in values.items():
+		row[REPORT_COLUMNS.index(column)] = value
+	return row
+
+
+def _order_ids(store: StateStore, account_id: str) -> List[str]:
+	return [row.get("orderId") for row in store.iter_rows(account_id, REPORT_COLUMNS)]
+
+
+def _lengths(rows: List[Tuple[Sequence[object], object]]) -> List[int]:
+	lengths = [len(c) for c in REPORT_COLUMNS]
+	for values, _ in rows:
+		for i, val in enumerate(values):
+			if val is not None:
+				lengths[i] = max(lengths[i], len(str(val)))
+	return lengths
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Iterator[StateStore]:
+	with StateStore(tmp_path / "state.sqlite3") as s:
+		yield s
+
+
+def test_replace_rows_reads_rows_outside_the_write_lock(store: StateStore) -> None:
+	started = threading.Event()
+
+	def slow_rows() -> Iterator[Sequence[object]]:
+		yield _row("a1", "2026-01-01")
+		started.set()
+		time.sleep(1.0)
+		yield _row("a2", "2026-01-02")
+
+	reload = threading.Thread(target=store.replace_rows, args=("acc", slow_rows(), REPORT_COLUMNS, NOW))
+	reload.start()
+	assert started.wait(5)
+	began = time.perf_counter()
+	store.upsert_rows("other", [{"orderId": "b1", "__createdAt": "2026-01-01"}], REPORT_COLUMNS, NOW)
+	waited = time.perf_counter() - began
+	reload.join()
+	assert waited < 0.5
+	assert _order_ids(store, "acc") == ["a1", "a2"]
+	assert _order_ids(store, "other") == ["b1"]
+
+
+def test_matches_detects_stale_state() -> None:
+	state = AccountState("acc", list(REPORT_COLUMNS), NOW, "f1", "rev2", "md5")
+	assert state.matches({"id": "f1", "headRevisionId": "rev2", "md5Checksum": "other"}, REPORT_COLUMNS)
+	assert not state.matches({"id": "f1", "headRevisionId": "rev3", "md5Checksum": "md5"}, REPORT_COLUMNS)
+	assert not state.matches({"id": "f2", "headRevisionId": "rev2"}, REPORT_COLUMNS)
+	assert not state.matches({"id": "f1", "headRevisionId": "rev2"}, REPORT_COLUMNS[:-1])
+	assert not state.matches(None, REPORT_COLUMNS)
+	# without revision ids the checksum decides
+	assert state.matches({"id": "f1", "md5Checksum": "md5"}, REPORT_COLUMNS)
+	no_rev = AccountState("acc", list(REPORT_COLUMNS), NOW, "f1", None, None)
+	assert not no_rev.matches({"id": "f1", "headRevisionId": "rev2"}, REPORT_COLUMNS)
+
+
+def test_local_changes_clear_the_remote_revision(store: StateStore) -> None:
+	meta = {"id": "f1", "headRevisionId": "rev1", "md5Checksum": "m1"}
+	store.replace_rows("acc", [_row("a1", "2026-01-01")], REPORT_COLUMNS, NOW, meta)
+	assert store.get("acc").matches(meta, REPORT_COLUMNS)
+	later = datetime(2026, 1, 2)
+	store.upsert_rows("acc", [{"orderId": "a2", "__createdAt": "2026-01-02"}], REPORT_COLUMNS, later)
+	state = store.get("acc")
+	assert state.last_sync == later
+	assert not state.matches(meta, REPORT_COLUMNS)
+	uploaded = {"id": "f1", "headRevisionId": "rev2", "md5Checksum": "m2"}
+	store.set_remote("acc", uploaded)
+	assert store.get("acc").matches(uploaded, REPORT_COLUMNS)
+
+
+def test_upsert_splits_created_and_updated(store: StateStore) -> None:
+	store.replace_rows("acc", [_row("a1", "2026-01-01"), _row("a2", "2026-01-02")], REPORT_COLUMNS, NOW)
+	store.replace_rows("other", [_row("a3", "2026-01-01")], REPORT_COLUMNS, NOW)
+	created, updated = store.upsert_rows("acc", [
+		{"orderId": "a2", "__createdAt": "2026-01-02", "POL": "x"},
+		{"orderId": "a3", "__createdAt": "2026-01-03"},
+		{"orderId": "a2", "__createdAt": "2026-01-02", "POL": "y"},
+		{"orderId": None},
+	], REPORT_COLUMNS, NOW)
+	# a3 belongs to another account: new here
+	assert created == ["a3"]
+	assert updated == ["a2"]
+	rows = {row.get("orderId"): row for row in store.iter_rows("acc", REPORT_COLUMNS)}
+	assert rows["a2"].get("POL") == "y"
+	assert len(rows) == 3
+
+
+def test_iter_rows_order_after_replace_then_upsert(store: StateStore) -> None:
+	store.replace_rows("acc", [
+		_row("b", "2026-01-02"),
+		_row("a", "2026-01-01"),
+		_row("c", "2026-01-02"),
+		_row("b", "2026-01-02", POL="dup"),
+	], REPORT_COLUMNS, NOW)
+	assert _order_ids(store, "acc") == ["a", "b", "c"]
+	assert store.get("acc").column_lengths[REPORT_COLUMNS.index("POL")] == len("POL")
+	store.upsert_rows("acc", [
+		{"orderId": "d", "__createdAt": "2026-01-02"},
+		{"orderId": "e", "__createdAt": "2025-12-31"},
+		{"orderId": "b", "__createdAt": "2026-01-02", "POL": "updated POL"},
+	], REPORT_COLUMNS, NOW)
+	# __createdAt ascending, ties in first-insertion order (an update keeps its place)
+	assert _order_ids(store, "acc") == ["e", "a", "b", "c", "d"]
+	assert store.get("acc").column_lengths[REPORT_COLUMNS.index("POL")] == len("updated POL")
+
+
+def test_rebuild_stages_resumes_and_finishes(tmp_path: Path) -> None:
+	orders = make_orders(1200, BENCH_ACCOUNT_ID)
+	rows = [(doc_to_report_tuple(doc), doc) for doc in orders]
+	path = tmp_path / "state.sqlite3"
+	started = datetime(2026, 1, 3)
+	with StateStore(path) as store:
+		store.replace_rows("acc", [_row("old", "2020-01-01")], REPORT_COLUMNS, NOW)
+		store.start_rebuild("acc", REPORT_COLUMNS, started)
+		assert store.stage_rebuild_rows("acc", iter(rows[:700]), REPORT_COLUMNS, key=order_key) == 700
+	# a new process picks the checkpoint up
+	with StateStore(path) as store:
+		checkpoint = store.get_rebuild("acc")
+		assert checkpoint.row_count == 700
+		assert checkpoint.last_key == order_key(orders[699])
+		assert checkpoint.started_at == started
+		# the account's rows are untouched until the rebuild finishes
+		assert _order_ids(store, "acc") == ["old"]
+		store.stage_rebuild_rows("acc", iter(rows[700:]), REPORT_COLUMNS, key=order_key)
+		assert store.finish_rebuild("acc") == 1200
+		assert store.get_rebuild("acc") is None
+		assert _order_ids(store, "acc") == [str(doc["_id"]) for doc in orders]
+		state = store.get("acc")
+		assert state.last_sync == started
+		assert state.column_lengths == _lengths(rows)
+		with pytest.raises(LookupError):
+			store.finish_rebuild("acc")
+
+
+def test_start_rebuild_drops_staged_rows(store: StateStore) -> None:
+	rows = [(doc_to_report_tuple(doc), doc) for doc in make_orders(10, BENCH_ACCOUNT_ID)]
+	store.start_rebuild("acc", REPORT_COLUMNS, NOW)
+	store.stage_rebuild_rows("acc", iter(rows), REPORT_COLUMNS, key=order_key)
+	store.start_rebuild("acc", REPORT_COLUMNS, NOW)
+	assert store.get_rebuild("acc").row_count == 0
+	assert store.finish_rebuild("acc") == 0
+
+
+def test_opens_stores_without_column_lengths(tmp_path: Path) -> None:
+	path = tmp_path / "state.sqlite3"
+	conn = sqlite3.connect(str(path))
+	conn.execute("CREATE TABLE account_state (account_id TEXT PRIMARY KEY, columns TEXT NOT NULL, last_sync TEXT, file_id TEXT, head_revision_id TEXT, md5 TEXT)")
+	conn.execute("INSERT INTO account_state VALUES ('acc', ?, ?, 'f1', 'rev1', NULL)", (json.dumps(REPORT_COLUMNS), NOW.isoformat()))
+	conn.commit()
+	conn.close()
+	with StateStore(path) as store:
+		state = store.get("acc")
+		assert state.file_id == "f1" and state.column_lengths is None
+		store.upsert_rows("acc", [{"orderId": "a1", "__createdAt": "2026-01-01"}], REPORT_COLUMNS, NOW)
+		assert store.get("acc").column_lengths is None
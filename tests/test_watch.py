@@ -0,0 +1,130 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from order_sync import watch
+from order_sync.watch import AccountDebouncer, ResumeTokenStore, run_watch
+
+
+class FakeClock:
+	def __init__(self) -> None:
+		self.now = 0.0
+
+	def __call__(self) -> float:
+		return self.now
+
+
+def test_debounce_waits_for_quiet_period() -> None:
+	clock = FakeClock()
+	d = AccountDebouncer(debounce=5, max_delay=60, clock=clock)
+	d.touch("a")
+	clock.now = 3
+	d.touch("a")
+	clock.now = 7
+	assert d.due() == []
+	clock.now = 8
+	assert d.due() == ["a"]
+	d.done("a")
+	assert not d.pending
+	assert d.due() == []
+
+
+def test_max_delay_under_continuous_activity() -> None:
+	clock = FakeClock()
+	d = AccountDebouncer(debounce=5, max_delay=20, clock=clock)
+	d.touch("a")
+	for t in range(2, 20, 2):
+		clock.now = t
+		d.touch("a")
+		assert d.due() == []
+	clock.now = 20
+	assert d.due() == ["a"]
+
+
+def test_failed_sync_backs_off_exponentially() -> None:
+	clock = FakeClock()
+	d = AccountDebouncer(debounce=5, max_delay=60, retry_delay=10, max_retry_delay=35, clock=clock)
+	d.touch("a")
+	clock.now = 5
+	assert d.due() == ["a"]
+	delays = []
+	for _ in range(4):
+		delays.append(d.failed("a"))
+		retry_at = clock.now + delays[-1]
+		clock.now = retry_at - 1
+		assert d.due() == []
+		clock.now = retry_at
+		assert d.due() == ["a"]
+	assert delays == [10, 20, 35, 35]
+	assert d.pending and not d.waiting
+	assert d.failed_accounts == ["a"]
+	# new events do not cut the backoff short
+	d.failed("a")
+	d.touch("a")
+	clock.now += 34
+	assert d.due() == []
+	assert d.waiting is False
+	d.done("a")
+	assert d.failed_accounts == []
+	d.touch("a")
+	clock.now += 5
+	assert d.due() == ["a"]
+
+
+class FakeStream:
+	"""Change stream yielding one OrderLog insert per account in `events`, then idling; each
+	try_next() advances the clock one second."""
+
+	def __init__(self, clock: FakeClock, events: List[str], seconds: int) -> None:
+		self.clock = clock
+		self.events = list(events)
+		self.seconds = seconds
+		self.resume_token: Optional[Dict[str, Any]] = None
+
+	def try_next(self) -> Optional[Dict[str, Any]]:
+		self.clock.now += 1
+		self.resume_token = {"t": int(self.clock.now)}
+		if self.events:
+			return {"fullDocument": {"accountId": self.events.pop(0)}}
+		return None
+
+	@property
+	def alive(self) -> bool:
+		return self.clock.now < self.seconds
+
+	def __enter__(self) -> "FakeStream":
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		pass
+
+
+def _run(monkeypatch: pytest.MonkeyPatch, tokens: ResumeTokenStore, stream: FakeStream, failing: List[str]) -> List[str]:
+	monkeypatch.setattr(watch, "watch_order_logs", lambda *args, **kwargs: stream)
+	attempts: List[str] = []
+
+	def sync(acc: str) -> bool:
+		attempts.append(acc)
+		return acc not in failing
+
+	run_watch(None, ["a", "b"], sync, tokens, debounce=5, max_delay=60, retry_delay=10, log=lambda line: None, clock=stream.clock)
+	return attempts
+
+
+def test_failing_account_is_retried_with_backoff_and_token_still_saved(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+	tokens = ResumeTokenStore(tmp_path / "token.json")
+	tokens.save({"t": 0})
+	clock = FakeClock()
+	attempts = _run(monkeypatch, tokens, FakeStream(clock, ["a", "b"], seconds=200), failing=["a"])
+	# a: first sync, then retries after 10, 20, 40 and 80 s (not once per loop)
+	assert attempts.count("a") == 5
+	assert attempts.count("b") == 1
+	assert tokens.load() is not None and tokens.load()["t"] > 100
+	assert tokens.load_retry_accounts() == ["a"]
+
+	# on restart the failing account gets a sync even without new events
+	clock = FakeClock()
+	attempts = _run(monkeypatch, tokens, FakeStream(clock, [], seconds=5), failing=[])
+	assert attempts == ["a"]
+	assert tokens.load_retry_accounts() == []